@@ -0,0 +1,483 @@
+import argparse, io, json, multiprocessing, os, random, statistics, subprocess, sys, tempfile, time, tracemalloc
+
+import bin.helpers.database as database
+import bin.helpers.render as render
+
+# synthetic master dict shaped like the muledump one (same key layout, a few hundred sheets, some blueprints)
+def make_master_dict(item_count: int) -> dict[str: str | int]:
+    rng = random.Random(0)
+    sheets = [f'lofiObj{number}' for number in range(200)] + [f'playerskins{number}' for number in range(50)] + [f'petsDivine{number}' for number in range(50)]
+
+    master_dict = {}
+    for number in range(item_count):
+        master_dict[f'Item {number}'] = {
+            'File': rng.choice(sheets),
+            'Index': rng.randrange(4096),
+            'Size': rng.choice((8, 16, 32)),
+            'Quantity': rng.choice((0, 0, 0, 5)),
+            'Contained': [f'Item {rng.randrange(item_count)}' for _ in range(2)] if rng.random() < 0.02 else []
+        }
+    return master_dict
+
+# startup work the app does with the master: load it, collect its sheets and look up a quest's worth of items
+def _load_master(backend: str, path: str, lookups: list[str]) -> None:
+    if backend == 'json':
+        with open(path, 'r') as f:
+            master = json.load(f)
+        {item_dict['File'] for item_dict in master.values()}
+    else:
+        master = database.MasterDatabase(path)
+        master.sheets()
+
+    for name in lookups:
+        master[name]
+
+# runs in a fresh process so earlier runs don't affect time or memory; the startup time of one cold load, and how much it grew
+# the process's peak resident size (what the app's memory use goes up by, json's parsed objects and sqlite's page cache alike)
+def _measure_master(backend: str, path: str, lookups: list[str], queue: multiprocessing.Queue) -> None:
+    rss_before = _get_peak_rss_bytes()
+    start = time.perf_counter()
+    _load_master(backend, path, lookups)
+    seconds = time.perf_counter() - start
+    rss_after = _get_peak_rss_bytes()
+
+    queue.put({'Seconds': seconds, 'Peak RSS Bytes': rss_after - rss_before if rss_before != None else None})
+
+def _run_in_fresh_process(target, *args) -> dict:
+    context = multiprocessing.get_context('spawn') # a forked process would start with this one's memory
+    queue = context.Queue()
+    process = context.Process(target = target, args = (*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+# compares loading master.json against master.db; uses the real master.json if there is one
+def benchmark_master(item_count: int) -> dict:
+    with tempfile.TemporaryDirectory() as folder:
+        if os.path.exists('./bin/json/master.json'):
+            with open('./bin/json/master.json', 'r') as f:
+                master_dict = json.load(f)
+        else:
+            master_dict = make_master_dict(item_count)
+
+        json_path = os.path.join(folder, 'master.json')
+
+        with open(json_path, 'w') as f:
+            json.dump(master_dict, f, indent = 4, ensure_ascii = False)
+        database_path = database.build_master_database(master_dict, folder)
+
+        lookups = random.Random(1).sample(list(master_dict), min(20, len(master_dict)))
+
+        results = {'Items': len(master_dict)}
+        for backend, path in (('json', json_path), ('sqlite', database_path)):
+            results[backend] = _run_in_fresh_process(_measure_master, backend, path, lookups)
+            results[backend]['File Bytes'] = os.path.getsize(path)
+
+    return results
+
+def print_master_results(results: dict) -> None:
+    print(f'{results["Items"]} items')
+    print(f'{"backend":<8}{"startup (ms)":>14}{"peak rss (MB)":>16}{"file (MB)":>12}')
+    for backend in ('json', 'sqlite'):
+        result = results[backend]
+        peak_rss = f'{result["Peak RSS Bytes"] / 2 ** 20:.1f}' if result['Peak RSS Bytes'] != None else '-'
+        print(f'{backend:<8}{result["Seconds"] * 1000:>14.1f}{peak_rss:>16}{result["File Bytes"] / 2 ** 20:>12.1f}')
+
+    json_result, sqlite_result = results['json'], results['sqlite']
+    print(f'sqlite starts {json_result["Seconds"] / max(sqlite_result["Seconds"], 1e-9):.1f}x faster', end = '')
+    if json_result['Peak RSS Bytes'] != None:
+        print(f', peak rss {(json_result["Peak RSS Bytes"] - sqlite_result["Peak RSS Bytes"]) / 2 ** 20:.1f} MB lower', end = '')
+    print()
+
+# items on the bundled custom sheets only, so render benchmarks run offline; 'Blueprint N' items contain N other items
+def make_render_master_dict() -> dict[str: str | int]:
+    rng = random.Random(0)
+
+    master_dict = {}
+    for size in (8, 16, 32):
+        sprite_count = (128 // size) ** 2 # the custom sheets are 128x128
+        for index in range(sprite_count):
+            master_dict[f'Sprite {size}x{size} {index}'] = {'File': f'custom{size}x{size}', 'Index': index, 'Size': size, 'Quantity': 0, 'Contained': []}
+
+    for number in range(20):
+        master_dict[f'Token {number}'] = {'File': 'custom8x8', 'Index': rng.randrange(256), 'Size': 8, 'Quantity': rng.randrange(1, 100), 'Contained': []}
+
+    plain_names = list(master_dict)
+    for contained_count in (1, 2, 3):
+        master_dict[f'Blueprint {contained_count}'] = {'File': 'custom16x16', 'Index': contained_count, 'Size': 16, 'Quantity': 0, 'Contained': rng.sample(plain_names, contained_count)}
+
+    return master_dict
+
+# quests shaped like app.get_quest_info() returns, mixing sizes, quantities and blueprints
+# item_count limits them to that many different items, like event sheets that keep using the same tokens
+def make_render_entries(master_dict: dict[str: str | int], quest_count: int, item_count: int | None = None) -> list[dict[str: str | bool]]:
+    rng = random.Random(quest_count)
+    names = list(master_dict) if item_count == None else rng.sample(list(master_dict), item_count)
+    icons = sorted(file_name.removesuffix('.png') for file_name in os.listdir('./bin/icons') if file_name not in ('Arrow.png', 'Chooseable.png'))
+
+    return [{
+        'Input': rng.sample(names, rng.randint(1, 8)),
+        'Output': rng.sample(names, rng.randint(1, 4)),
+        'Title': f'Benchmark Quest {number}',
+        'Icon': rng.choice(icons),
+        'Chooseable': rng.random() < 0.5
+    } for number in range(quest_count)]
+
+# functions timed separately inside each case as (module, function name); times are inclusive, so 'Quest' contains 'Sprite' and 'Group' etc.
+RENDER_STAGES = {
+    'Template': (render, 'load_template'),
+    'Sheet': (render, 'get_sprite_from_sheet'),
+    'Sprite': (render, 'render_one_sprite'),
+    'Blueprint Contents': (render, 'paste_contained_item'),
+    'Tile': (render, 'get_tile'),
+    'Group': (render, 'generate_image_group'),
+    'Quest': (render, 'render_quest'),
+    'Combine': (render, 'place_quest'),
+    'Plan': (render.RenderPlan, 'render'),
+    'Encode': (render, 'encode_infographic')
+}
+
+def _run_with_stages(function) -> dict[str: dict]:
+    stages = {}
+    originals = {stage: getattr(module, function_name) for stage, (module, function_name) in RENDER_STAGES.items()}
+
+    def timed(stage, original):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                stage_result = stages.setdefault(stage, {'Seconds': 0.0, 'Calls': 0})
+                stage_result['Seconds'] += time.perf_counter() - start
+                stage_result['Calls'] += 1
+        return wrapper
+
+    for stage, original in originals.items():
+        setattr(*RENDER_STAGES[stage], timed(stage, original))
+    try:
+        stages['Total'] = {'Seconds': _time_once(function), 'Calls': 1}
+    finally:
+        for stage, original in originals.items():
+            setattr(*RENDER_STAGES[stage], original)
+
+    return stages
+
+# every run starts cold: no decoded sheets or finished sprites carried over from the previous run
+def _time_once(function) -> float:
+    render.clear_caches()
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def get_render_cases(master_dict: dict[str: str | int], quest_counts: list[int]) -> dict[str: object]:
+    cases = {}
+
+    for size in (8, 16, 32):
+        cases[f'Sprite {size}x{size}'] = lambda size = size: render.render_one_sprite(render.get_sprite_from_sheet(f'custom{size}x{size}', 1, size), 0)
+    cases['Sprite With Quantity'] = lambda: render.render_one_sprite(render.get_sprite_from_sheet('custom8x8', 1, 8), 64)
+
+    for contained_count in (1, 2, 3):
+        def render_blueprint(item_dict = master_dict[f'Blueprint {contained_count}']):
+            sprite = render.get_rendered_sprite(item_dict)
+            render.paste_contained_item(master_dict, sprite, item_dict['Contained'])
+        cases[f'Blueprint {contained_count} Contained'] = render_blueprint
+
+    for group_size in range(1, 9):
+        names = [f'Sprite 16x16 {index}' for index in range(group_size)]
+        cases[f'Group {group_size}'] = lambda names = names: render.generate_image_group([render.get_item_tile(master_dict, name, render.get_group_size(len(names))) for name in names])
+
+    for quest_count in quest_counts:
+        entries = make_render_entries(master_dict, quest_count)
+        cases[f'Quests {quest_count}'] = lambda entries = entries: render.encode_infographic(render.generate_infographic(master_dict, entries, parallel = False), io.BytesIO())
+
+        entries = make_render_entries(master_dict, quest_count, item_count = 12)
+        cases[f'Quests {quest_count} Same Items'] = lambda entries = entries: render.encode_infographic(render.generate_infographic(master_dict, entries, parallel = False), io.BytesIO())
+
+    return cases
+
+# highest resident size this process has had so far, None if the platform isn't handled
+def _get_peak_rss_bytes() -> int | None:
+    if sys.platform == 'win32':
+        import ctypes, ctypes.wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', ctypes.wintypes.DWORD), ('PageFaultCount', ctypes.wintypes.DWORD)] + [(field, ctypes.c_size_t) for field in ('PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+
+    if os.path.exists('/proc/self/status'): # ru_maxrss on linux carries over the parent's peak through fork and exec
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # bytes on macos
+
+# peak memory of one cold run in a fresh process: python objects from tracemalloc, and image buffers
+# (which tracemalloc doesn't see) from how much the process's peak resident size grew
+def _measure_render_memory(case_name: str, quest_counts: list[int], queue: multiprocessing.Queue) -> None:
+    render.SPRITE_DISK_CACHE = 0
+    render.QUEST_DISK_CACHE = 0
+    function = get_render_cases(make_render_master_dict(), quest_counts)[case_name]
+
+    rss_before = _get_peak_rss_bytes()
+    tracemalloc.start()
+    function()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_after = _get_peak_rss_bytes()
+
+    queue.put({'Peak Bytes': peak_bytes, 'Peak RSS Bytes': rss_after - rss_before if rss_before != None else None})
+
+# wall time over repeat cold runs, then one run with per-stage timings and one in a fresh process for memory
+def benchmark_render(quest_counts: list[int], repeat: int) -> dict:
+    render.SPRITE_DISK_CACHE = 0 # bin/cache would make every run after the first one warm
+    render.QUEST_DISK_CACHE = 0
+
+    master_dict = make_render_master_dict()
+    results = {'Repeat': repeat, 'Cases': {}}
+
+    for name, function in get_render_cases(master_dict, quest_counts).items():
+        seconds = [_time_once(function) for _ in range(repeat)]
+        stages = _run_with_stages(function)
+
+        results['Cases'][name] = {'Min Seconds': min(seconds), 'Median Seconds': statistics.median(seconds), **_run_in_fresh_process(_measure_render_memory, name, quest_counts), 'Stages': stages}
+        print_render_result(name, results['Cases'][name])
+
+    render.clear_caches()
+
+    return results
+
+def print_render_result(name: str, result: dict) -> None:
+    stages = ', '.join(f'{stage} {stage_result["Seconds"] * 1000:.1f}' for stage, stage_result in result['Stages'].items() if stage != 'Total')
+    peak_rss = f'{result["Peak RSS Bytes"] / 2 ** 20:.1f}' if result['Peak RSS Bytes'] != None else '-'
+    print(f'{name:<24}{result["Min Seconds"] * 1000:>10.1f}{result["Median Seconds"] * 1000:>12.1f}{result["Peak Bytes"] / 2 ** 20:>12.1f}{peak_rss:>10}   {stages}')
+
+# (label, render.encode_infographic options) compared by benchmark_encode
+ENCODE_VARIANTS = [
+    ('png level 0', {'output_format': 'png', 'compress_level': 0, 'optimize': 0, 'quantize': 0}),
+    ('png level 1', {'output_format': 'png', 'compress_level': 1, 'optimize': 0, 'quantize': 0}),
+    ('png level 3', {'output_format': 'png', 'compress_level': 3, 'optimize': 0, 'quantize': 0}),
+    ('png level 6', {'output_format': 'png', 'compress_level': 6, 'optimize': 0, 'quantize': 0}),
+    ('png level 9', {'output_format': 'png', 'compress_level': 9, 'optimize': 0, 'quantize': 0}),
+    ('png optimize', {'output_format': 'png', 'compress_level': 9, 'optimize': 1, 'quantize': 0}),
+    ('png level 6 quantize', {'output_format': 'png', 'compress_level': 6, 'optimize': 0, 'quantize': 1}),
+    ('webp lossless', {'output_format': 'webp'})
+]
+
+# size and encode time of one infographic per quest count in every output variant, each checked to decode to the same pixels
+def benchmark_encode(quest_counts: list[int], repeat: int) -> dict:
+    render.SPRITE_DISK_CACHE = 0
+    render.QUEST_DISK_CACHE = 0
+
+    master_dict = make_render_master_dict()
+    results = {'Repeat': repeat, 'Infographics': {}}
+
+    for quest_count in quest_counts:
+        image = render.generate_infographic(master_dict, make_render_entries(master_dict, quest_count), parallel = False)
+        variants = {}
+
+        for label, options in ENCODE_VARIANTS:
+            seconds = []
+
+            try:
+                for _ in range(repeat):
+                    file = io.BytesIO()
+                    start = time.perf_counter()
+                    render.encode_infographic(image, file, **options)
+                    seconds.append(time.perf_counter() - start)
+
+            except ValueError as exception: # webp size limit
+                variants[label] = {'Error': str(exception)}
+                continue
+
+            file.seek(0)
+            with render.Img.open(file) as decoded:
+                lossless = decoded.convert('RGBA').tobytes() == image.tobytes()
+
+            variants[label] = {'Median Seconds': statistics.median(seconds), 'Bytes': len(file.getvalue()), 'Lossless': lossless}
+
+        results['Infographics'][f'{quest_count} Quests'] = {'Width': image.size[0], 'Height': image.size[1], 'Variants': variants}
+
+    return results
+
+def print_encode_results(results: dict) -> None:
+    for name, infographic in results['Infographics'].items():
+        print(f'{name} ({infographic["Width"]}x{infographic["Height"]})')
+        print(f'{"variant":<24}{"encode (ms)":>12}{"size (KB)":>12}{"lossless":>10}')
+
+        for label, variant in infographic['Variants'].items():
+            if 'Error' in variant:
+                print(f'{label:<24}{"-":>12}{"-":>12}{"-":>10}   {variant["Error"]}')
+            else:
+                print(f'{label:<24}{variant["Median Seconds"] * 1000:>12.1f}{variant["Bytes"] / 1024:>12.1f}{"yes" if variant["Lossless"] else "NO":>10}')
+        print()
+
+# run with python -c in a new interpreter, a spawned process would import this file (and render) first
+# everything main.py does before the window appears, then what reload_master does behind the window (master load, item index,
+# disk cache pruning and clearing the render caches for the new master), so config reads after the window are counted too
+STARTUP_SCRIPT = '''
+import builtins, json, os, sys, time
+start = time.perf_counter()
+
+config_reads = 0
+original_open = builtins.open
+def counting_open(file, *args, **kwargs):
+    global config_reads
+    if str(file).endswith('config.json'):
+        config_reads += 1
+    return original_open(file, *args, **kwargs)
+builtins.open = counting_open
+
+import main
+main.load.get_config()
+imported = time.perf_counter()
+
+master_seconds = None
+if os.path.exists('./bin/json/master.json'):
+    master_dict = main.load.get_master_dict()
+    main.search.ItemIndex(master_dict)
+    main.render.prune_disk_caches()
+    main.render.clear_caches()
+    master_seconds = time.perf_counter() - imported
+
+heavy_modules = [name for name in ('aiohttp', 'asyncio', 'PIL.ImageDraw', 'PIL.ImageFilter', 'PIL.ImageFont', 'PIL.ImageTk') if name in sys.modules]
+print(json.dumps({'Import Seconds': imported - start, 'Master Seconds': master_seconds, 'Config Reads': config_reads, 'Heavy Modules': heavy_modules}))
+'''
+
+# cold start in new interpreters: time until the window can be built (imports + config) and the master load
+def benchmark_startup(repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output = True, text = True, check = True)
+        runs.append(json.loads(completed.stdout.splitlines()[-1]))
+
+    return {
+        'Repeat': repeat,
+        'Import Seconds': statistics.median(run['Import Seconds'] for run in runs),
+        'Master Seconds': statistics.median(run['Master Seconds'] for run in runs) if runs[0]['Master Seconds'] != None else None,
+        'Config Reads': runs[0]['Config Reads'],
+        'Heavy Modules': runs[0]['Heavy Modules']
+    }
+
+def print_startup_results(results: dict) -> None:
+    print(f'imports + config (before the window): {results["Import Seconds"] * 1000:.0f} ms (median of {results["Repeat"]})')
+    if results['Master Seconds'] != None:
+        print(f'master load + item index (behind the window): {results["Master Seconds"] * 1000:.0f} ms')
+    else:
+        print('master load: no master.json')
+    print(f'config.json reads: {results["Config Reads"]}')
+    print(f'heavy modules loaded at startup: {", ".join(results["Heavy Modules"]) or "none"}')
+
+# milliseconds for one call of function, including the redraw it causes
+def _time_ui(app, function) -> float:
+    start = time.perf_counter()
+    function()
+    app.root.update()
+    return (time.perf_counter() - start) * 1000
+
+# add, scroll, read and delete latency of the quest editor once it holds quest_count filled quests; needs a display
+def benchmark_editor(quest_count: int, operations: int) -> dict:
+    import tkinter as tk
+    import bin.helpers.ui as ui
+
+    try:
+        app = ui.App()
+    except tk.TclError as exception:
+        return {'Skipped': f'no display ({exception})'}
+
+    rng = random.Random(0)
+    names = list(make_render_master_dict())
+    app.root.update()
+
+    timings = {'Add': [], 'Scroll': [], 'Wheel': [], 'Read': [], 'Delete': []}
+    try:
+        for number in range(quest_count):
+            quest = ui.Quest(title = f'Benchmark Quest {number}', input = '\n'.join(rng.sample(names, rng.randint(1, 8))), output = '\n'.join(rng.sample(names, rng.randint(1, 4))))
+            timings['Add'].append(_time_ui(app, lambda quest = quest: app.add_quest(quest)))
+
+        for _ in range(operations):
+            timings['Scroll'].append(_time_ui(app, lambda: app.quest_canvas.yview_moveto(rng.random()))) # dragging the scrollbar
+            timings['Wheel'].append(_time_ui(app, lambda: app.quest_canvas.yview_scroll(rng.choice((-3, 3)), 'units')))
+
+        for _ in range(operations):
+            timings['Read'].append(_time_ui(app, app.get_quest_info))
+
+        for deleted in range(min(operations, quest_count)):
+            timings['Delete'].append(_time_ui(app, lambda index = rng.randrange(quest_count - deleted): app.delete_quest(index)))
+
+    finally:
+        app.root.destroy()
+
+    return {'Quests': quest_count, 'Operations': {name: {'Calls': len(milliseconds), 'Median Ms': statistics.median(milliseconds), 'Max Ms': max(milliseconds)} for name, milliseconds in timings.items() if milliseconds}}
+
+def print_editor_results(results: dict) -> None:
+    if 'Skipped' in results:
+        print(f'skipped: {results["Skipped"]}')
+        return
+
+    print(f'{results["Quests"]} quests')
+    print(f'{"operation":<12}{"calls":>8}{"median (ms)":>14}{"max (ms)":>12}')
+    for name, operation in results['Operations'].items():
+        print(f'{name:<12}{operation["Calls"]:>8}{operation["Median Ms"]:>14.2f}{operation["Max Ms"]:>12.2f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Quest Infographic Maker benchmarks')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    master_parser = subparsers.add_parser('master', help = 'master.json vs master.db startup cost')
+    master_parser.add_argument('--items', type = int, default = 40000, help = 'size of the synthetic master when there is no master.json')
+    master_parser.add_argument('-o', '--output', help = 'also save the results to this json file')
+
+    render_parser = subparsers.add_parser('render', help = 'render times for sprites, groups, blueprints and whole infographics (offline, custom sheets only)')
+    render_parser.add_argument('--quests', type = int, nargs = '+', default = [1, 10, 100], help = 'infographic sizes to render')
+    render_parser.add_argument('--repeat', type = int, default = 5, help = 'cold runs per case')
+    render_parser.add_argument('-o', '--output', help = 'also save the results to this json file')
+
+    startup_parser = subparsers.add_parser('startup', help = 'cold start time of the app in new interpreters')
+    startup_parser.add_argument('--repeat', type = int, default = 5, help = 'interpreters to start')
+    startup_parser.add_argument('-o', '--output', help = 'also save the results to this json file')
+
+    encode_parser = subparsers.add_parser('encode', help = 'output size and encode time of each png/webp option')
+    encode_parser.add_argument('--quests', type = int, nargs = '+', default = [1, 10, 100], help = 'infographic sizes to encode')
+    encode_parser.add_argument('--repeat', type = int, default = 3, help = 'encodes per variant')
+    encode_parser.add_argument('-o', '--output', help = 'also save the results to this json file')
+
+    editor_parser = subparsers.add_parser('editor', help = 'add/scroll/delete latency of the quest editor (needs a display)')
+    editor_parser.add_argument('--quests', type = int, default = 500, help = 'quests in the editor')
+    editor_parser.add_argument('--operations', type = int, default = 100, help = 'scrolls, reads and deletes to time')
+    editor_parser.add_argument('-o', '--output', help = 'also save the results to this json file')
+
+    arguments = parser.parse_args()
+
+    if arguments.command == 'master':
+        results = benchmark_master(arguments.items)
+        print_master_results(results)
+
+    if arguments.command == 'startup':
+        results = benchmark_startup(arguments.repeat)
+        print_startup_results(results)
+
+    if arguments.command == 'encode':
+        results = benchmark_encode(arguments.quests, arguments.repeat)
+        print_encode_results(results)
+
+    if arguments.command == 'editor':
+        results = benchmark_editor(arguments.quests, arguments.operations)
+        print_editor_results(results)
+
+    if arguments.command == 'render':
+        print(f'{"case":<24}{"min (ms)":>10}{"median (ms)":>12}{"python (MB)":>12}{"rss (MB)":>10}   stages (ms, inclusive)')
+        results = benchmark_render(arguments.quests, arguments.repeat)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump(results, f, indent = 4)
@@ -0,0 +1,149 @@
+import json, os, sqlite3, sys, threading, time
+
+DATABASE_FOLDER = './bin/json'
+
+def _row_to_item_dict(file: str, index: int, size: int, quantity: int, contained: str) -> dict[str: str | int]:
+    return {
+        'File': sys.intern(file), # a few hundred sheets are shared by every item
+        'Index': index,
+        'Size': size,
+        'Quantity': quantity,
+        'Contained': json.loads(contained) if contained else []
+    }
+
+# path of the newest master database build in folder (see build_master_database), None if there isn't one yet
+def get_master_database_path(folder: str = DATABASE_FOLDER) -> str | None:
+    try:
+        with open(f'{folder}/master-db.json', 'r') as f:
+            path = f'{folder}/{json.load(f)["File"]}'
+    except (OSError, ValueError, KeyError): # missing, or left half written by an older version
+        return None
+
+    return path if os.path.exists(path) else None
+
+# sqlite version of master.json, only rows that are looked up get loaded into memory
+# behaves like the master dict for everything the program does with it: master_database[name], name in master_database, len, iteration, get, items, values
+# path defaults to the newest build; the build it opened is never changed, so it keeps showing the same items until it's swapped for a new one
+class MasterDatabase:
+    __slots__ = ('_path', '_connection', '_lock', '_rows', '_sheets', '_length')
+
+    def __init__(self, path: str | None = None):
+        if path == None:
+            path = get_master_database_path()
+            if path == None:
+                raise FileNotFoundError(f'{DATABASE_FOLDER}/master-db.json')
+        elif not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+        self._path = path
+        self._connection = sqlite3.connect(f'file:{path}?mode=ro', uri = True, check_same_thread = False) # read only, shared between the ui and render threads
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._sheets = None
+        self._length = None
+
+    # lets process pools pickle it (each process opens its own connection)
+    def __reduce__(self):
+        return (MasterDatabase, (self._path,))
+
+    def __getitem__(self, name: str) -> dict[str: str | int]:
+        if name in self._rows:
+            return self._rows[name]
+
+        with self._lock:
+            row = self._connection.execute('SELECT File, SheetIndex, Size, Quantity, Contained FROM items WHERE Name = ?', (name,)).fetchone()
+        if row == None:
+            raise KeyError(name)
+
+        item_dict = _row_to_item_dict(*row)
+        self._rows[name] = item_dict
+
+        return item_dict
+
+    def __contains__(self, name: str) -> bool:
+        if name in self._rows:
+            return True
+
+        with self._lock:
+            return self._connection.execute('SELECT 1 FROM items WHERE Name = ?', (name,)).fetchone() != None
+
+    def __len__(self) -> int:
+        if self._length == None:
+            with self._lock:
+                self._length = self._connection.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        return self._length
+
+    def __iter__(self):
+        with self._lock:
+            names = [row[0] for row in self._connection.execute('SELECT Name FROM items ORDER BY Position')]
+        return iter(names)
+
+    def keys(self) -> list[str]:
+        return list(self)
+
+    # every item in one query, in master.json order; rows aren't kept in memory like the ones looked up by name
+    def items(self) -> list[tuple[str, dict[str: str | int]]]:
+        with self._lock:
+            rows = self._connection.execute('SELECT Name, File, SheetIndex, Size, Quantity, Contained FROM items ORDER BY Position').fetchall()
+
+        return [(name, _row_to_item_dict(*row)) for name, *row in rows]
+
+    def values(self) -> list[dict[str: str | int]]:
+        return [item_dict for _, item_dict in self.items()]
+
+    def get(self, name: str, default = None) -> dict[str: str | int] | None:
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    # every sheet used by an item, stored when the database is built
+    def sheets(self) -> set[str]:
+        if self._sheets == None:
+            with self._lock:
+                self._sheets = {row[0] for row in self._connection.execute('SELECT Name FROM sheets')}
+        return set(self._sheets)
+
+    def close(self) -> None:
+        self._connection.close()
+
+# writes master_dict to a new master-<ns>.db in folder and points master-db.json at it once it's complete, returns its path
+# a new file every build (like the sprite atlas), so open databases keep the items they had until they're swapped; rebuilding in
+# place would show the new items to them halfway through an update, mixed with the rows they already cached
+def build_master_database(master_dict: dict[str: str | int], folder: str = DATABASE_FOLDER) -> str:
+    file_name = f'master-{time.time_ns()}.db'
+    path = f'{folder}/{file_name}'
+    connection = sqlite3.connect(path, isolation_level = None) # transaction is handled below so the CREATEs are part of it
+
+    try:
+        connection.execute('BEGIN')
+        connection.execute('CREATE TABLE items (Position INTEGER PRIMARY KEY, Name TEXT UNIQUE NOT NULL, File TEXT NOT NULL, SheetIndex INTEGER NOT NULL, Size INTEGER NOT NULL, Quantity INTEGER NOT NULL, Contained TEXT NOT NULL)')
+        connection.execute('CREATE TABLE sheets (Name TEXT PRIMARY KEY)')
+
+        connection.executemany('INSERT INTO items (Name, File, SheetIndex, Size, Quantity, Contained) VALUES (?, ?, ?, ?, ?, ?)', (
+            (name, item_dict['File'], item_dict['Index'], item_dict['Size'], item_dict['Quantity'], json.dumps(item_dict['Contained'], ensure_ascii = False) if item_dict['Contained'] else '')
+            for name, item_dict in master_dict.items()
+        ))
+        connection.executemany('INSERT INTO sheets (Name) VALUES (?)', ((sheet,) for sheet in {item_dict['File'] for item_dict in master_dict.values()}))
+        connection.execute('COMMIT')
+
+    except Exception:
+        connection.execute('ROLLBACK')
+        connection.close()
+        os.remove(path)
+        raise
+
+    connection.close()
+
+    with open(f'{folder}/master-db.json.tmp', 'w') as f:
+        json.dump({'File': file_name}, f)
+    os.replace(f'{folder}/master-db.json.tmp', f'{folder}/master-db.json')
+
+    for old_file_name in os.listdir(folder): # older builds, and master.db from versions that rebuilt it in place
+        if old_file_name != file_name and (old_file_name == 'master.db' or (old_file_name.startswith('master-') and old_file_name.endswith('.db'))):
+            try:
+                os.remove(f'{folder}/{old_file_name}')
+            except OSError: # still open in another process on windows, removed on the next build
+                pass
+
+    return path
@@ -0,0 +1,124 @@
+import atexit, collections, contextlib, functools, json, multiprocessing, os, threading, time
+import bin.helpers.settings as settings
+
+config = settings.config
+
+# stage timers and counters for the render and load pipelines; when disabled every call below returns right away
+# the environment variable QUEST_INFOGRAPHIC_INSTRUMENT=1 (or 0) overrides the config for one run
+ENABLED = bool(int(os.environ.get('QUEST_INFOGRAPHIC_INSTRUMENT', config['Instrumentation'])))
+REPORT_FOLDER = './bin/profile'
+MAX_EVENTS = 200000 # trace events kept, totals keep counting after that
+
+_lock = threading.Lock()
+_stages = {} # stage name -> [calls, total seconds, longest seconds]
+_counters = collections.Counter()
+_events = [] # (stage name, start, end, thread id) for the chrome trace
+_thread_names = {}
+_start_time = time.perf_counter()
+
+_null_stage = contextlib.nullcontext()
+
+class _Stage:
+    __slots__ = ('_name', '_start')
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception_info) -> bool:
+        _record(self._name, self._start, time.perf_counter())
+        return False
+
+def _record(name: str, start: float, end: float) -> None:
+    thread = threading.current_thread()
+
+    with _lock:
+        totals = _stages.setdefault(name, [0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += end - start
+        totals[2] = max(totals[2], end - start)
+
+        if len(_events) < MAX_EVENTS:
+            _events.append((name, start, end, thread.ident))
+            _thread_names[thread.ident] = thread.name
+
+# with instrument.stage('Decode Sheet'): ...
+def stage(name: str):
+    if not ENABLED:
+        return _null_stage
+    return _Stage(name)
+
+# decorator version of stage for whole functions, leaves the function untouched when disabled
+def timed(name: str):
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+# a stage timed somewhere else, like a pool worker (perf_counter is shared between processes on the same machine)
+def record(name: str, start: float, end: float) -> None:
+    if not ENABLED:
+        return
+
+    _record(name, start, end)
+
+def count(name: str, amount: int = 1) -> None:
+    if not ENABLED:
+        return
+
+    with _lock:
+        _counters[name] += amount
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _events.clear()
+        _thread_names.clear()
+
+# totals per stage (slowest first) and counters
+def get_report() -> dict:
+    with _lock:
+        stages = {name: {'Calls': calls, 'Seconds': seconds, 'Longest Seconds': longest} for name, (calls, seconds, longest) in sorted(_stages.items(), key = lambda item: -item[1][1])}
+        return {'Stages': stages, 'Counters': dict(sorted(_counters.items()))}
+
+def save_report(path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(get_report(), f, indent = 4, ensure_ascii = False)
+
+# opens in chrome://tracing or ui.perfetto.dev
+def save_chrome_trace(path: str) -> None:
+    with _lock:
+        trace_events = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread_id, 'args': {'name': thread_name}} for thread_id, thread_name in _thread_names.items()]
+        trace_events.extend({
+            'name': name,
+            'ph': 'X',
+            'ts': (start - _start_time) * 1e6, # microseconds
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': thread_id
+        } for name, start, end, thread_id in _events)
+
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii = False)
+
+def _save_on_exit() -> None:
+    if _stages == {} and not _counters:
+        return
+
+    os.makedirs(REPORT_FOLDER, exist_ok = True)
+    save_report(f'{REPORT_FOLDER}/report.json')
+    save_chrome_trace(f'{REPORT_FOLDER}/trace.json')
+
+if ENABLED and multiprocessing.parent_process() == None: # render workers would overwrite the main process's files
+    atexit.register(_save_on_exit)
@@ -1,5 +1,12 @@
-import aiohttp, asyncio, json, os, re
+from __future__ import annotations # aiohttp and asyncio only appear in annotations until an update runs
+import concurrent.futures, hashlib, json, multiprocessing, os, re, threading, time
 import xml.etree.ElementTree as ET
+import bin.helpers.database as database
+import bin.helpers.instrument as instrument
+import bin.helpers.render as render
+import bin.helpers.settings as settings
+
+# aiohttp and asyncio are imported by the functions that use them, they take most of the startup time otherwise
 
 # checks for required folders, returns folders that were missing (need filling)
 def check_folders() -> None | list[str]:
@@ -44,45 +51,189 @@ def check_files() -> None | list[str]:
     if files_missing != []:
         return files_missing
 
-# for async downloading, takes a session and a url and returns the body of the response
-async def fetch(session: aiohttp.ClientSession, url: str) -> bytes:
-    async with session.get(url) as response:
-        return await response.read()
+# for reporting update progress; callback(text, fraction) is called on the update's thread, fraction is None when unknown
+class UpdateProgress:
+    def __init__(self, callback = None):
+        self._callback = callback
+        self._stage = ''
+        self._files_done = 0
+        self._files_total = 0
+        self._bytes = 0
+
+    def start_stage(self, stage: str, files_total: int) -> None:
+        self._stage = stage
+        self._files_done = 0
+        self._files_total = files_total
+        self._bytes = 0
+        self._report()
+
+    def add_bytes(self, byte_count: int) -> None:
+        self._bytes += byte_count
+        self._report()
+
+    def file_done(self) -> None:
+        self._files_done += 1
+        self._report()
+
+    def message(self, text: str) -> None:
+        if self._callback != None:
+            self._callback(text, None)
+
+    def _report(self) -> None:
+        if self._callback != None:
+            fraction = self._files_done / self._files_total if self._files_total else None
+            self._callback(f'{self._stage}: {self._files_done}/{self._files_total} files, {self._bytes / 2 ** 20:.1f} MB', fraction)
+
+DOWNLOAD_FOLDER = './bin/downloads' # unfinished and uncommitted downloads, kept out of bin/xml so parse_all never sees them
+
+# for async downloading; streams url into a .part file in DOWNLOAD_FOLDER, returns False if the server says the file didn't change (304)
+# finished downloads are added to staged and only put in place by commit_downloads, so a cancelled update never mixes old and new files
+# validators holds the ETag/Last-Modified of each url, an interrupted download is resumed from its .part file if the server still has the same version
+async def download(session: aiohttp.ClientSession, url: str, path: str, semaphore: asyncio.Semaphore, validators: dict[str: dict[str: str]], retries: int, staged: list[tuple], progress: UpdateProgress) -> bool:
+    import aiohttp, asyncio
+
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                changed = await _download_once(session, url, path, validators, staged, progress)
+                progress.file_done()
+                return changed
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+                if attempt == retries or (isinstance(exception, aiohttp.ClientResponseError) and exception.status < 500): # client errors won't fix themselves
+                    raise
+                instrument.count('Download Retries')
+                await asyncio.sleep(2 ** attempt) # 1s, 2s, 4s...
+
+async def _download_once(session: aiohttp.ClientSession, url: str, path: str, validators: dict[str: dict[str: str]], staged: list[tuple], progress: UpdateProgress) -> bool:
+    part_path = f'{DOWNLOAD_FOLDER}/{os.path.basename(path)}.part'
+    os.makedirs(DOWNLOAD_FOLDER, exist_ok = True)
+    url_validators = validators.setdefault(url, {})
+    headers = {}
+
+    if os.path.exists(path): # conditional only if there is a file to keep
+        if 'ETag' in url_validators:
+            headers['If-None-Match'] = url_validators['ETag']
+        if 'Last-Modified' in url_validators:
+            headers['If-Modified-Since'] = url_validators['Last-Modified']
+
+    if os.path.exists(part_path) and 'Part ETag' in url_validators:
+        headers['Range'] = f'bytes={os.path.getsize(part_path)}-'
+        headers['If-Range'] = url_validators['Part ETag'] # server sends the whole file instead if it changed since
+
+    async with session.get(url, headers = headers) as response:
+        if response.status == 304:
+            instrument.count('Downloads Not Modified')
+            return False
+
+        if response.status == 416: # .part was already complete (update cancelled before it was committed), start over
+            os.remove(part_path)
+            del url_validators['Part ETag']
+            return await _download_once(session, url, path, validators, staged, progress)
+
+        response.raise_for_status()
+
+        etag = response.headers.get('ETag')
+        if etag != None and not etag.startswith('W/'): # weak etags can't be used for If-Range
+            url_validators['Part ETag'] = etag
+
+        mode = 'ab' if response.status == 206 else 'wb'
+        instrument.count('Downloads Resumed' if response.status == 206 else 'Downloads')
+        with open(part_path, mode) as f:
+            async for chunk in response.content.iter_chunked(65536):
+                f.write(chunk)
+                progress.add_bytes(len(chunk))
+                instrument.count('Bytes Downloaded', len(chunk))
+
+        new_validators = {}
+        if etag != None:
+            new_validators['ETag'] = etag
+        if 'Last-Modified' in response.headers:
+            new_validators['Last-Modified'] = response.headers['Last-Modified']
+
+    staged.append((part_path, path, url, new_validators))
+
+    return True
+
+# moves staged downloads into place (os.replace is atomic) and remembers their validators
+def commit_downloads(staged: list[tuple], validators: dict[str: dict[str: str]]) -> None:
+    for part_path, path, url, new_validators in staged:
+        os.replace(part_path, path)
+        validators[url] = new_validators
+
+    staged.clear()
+
+def get_validators() -> dict[str: dict[str: str]]:
+    try:
+        with open('./bin/json/downloads.json', 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_validators(validators: dict[str: dict[str: str]]) -> None:
+    with open('./bin/json/downloads.json', 'w') as f:
+        json.dump(validators, f, indent = 4, ensure_ascii = False)
+
+# downloads the xml files from config file (staged, see download), returns the names of files that changed
+async def download_xml_async(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, validators: dict[str: dict[str: str]], staged: list[tuple], progress: UpdateProgress) -> list[str]:
+    import asyncio
 
-# fills xml folder with files from config file
-async def download_xml_async(session: aiohttp.ClientSession) -> None:
-    with open('./bin/config.json', 'r') as f:
-        config = json.load(f)
+    config = get_config()
+    progress.start_stage('Downloading xml', len(config['XML URLs']))
     
     tasks = []
+    files = []
 
     for url in config['XML URLs']:
-        tasks.append(fetch(session, url))
-    contents = await asyncio.gather(*tasks)
+        files.append(url.rpartition("/")[2])
+        tasks.append(download(session, url, f'./bin/xml/{files[-1]}', semaphore, validators, config['Download Retries'], staged, progress))
+    changed = await asyncio.gather(*tasks)
 
-    for content, url in zip(contents, config['XML URLs']):
-        with open(f'./bin/xml/{url.rpartition("/")[2]}', 'wb') as f:
-            f.write(content)
+    return [file for file, file_changed in zip(files, changed) if file_changed]
 
 # IGNORES 32x32 SKINS (for now)
 # one file; generates a json file from an xml file (key is object name, values include file, index, size, quantity). returns the dictionary generated too
 def parse_xml(path: str, write = True) -> dict[str:str | int]:
     parsed = {}
 
-    objects = ET.parse(path).getroot()
+    depth = 0
+    root = None
+
+    for event, element in ET.iterparse(path, events = ('start', 'end')): # streamed so the whole tree is never held in memory
+        if event == 'start':
+            if root == None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 1: # only direct children of the root are objects, their subtrees are complete at their end event
+            continue
+
+        object = element
+        root.clear() # drops the objects handled so far (object itself stays alive until this iteration ends)
+
+        display_id = texture = animated_texture = activate = None
+        for child in object: # one pass over the children, first of each tag wins like find()
+            if child.tag == 'DisplayId' and display_id == None:
+                display_id = child
+            elif child.tag == 'Texture' and texture == None:
+                texture = child
+            elif child.tag == 'AnimatedTexture' and animated_texture == None:
+                animated_texture = child
+            elif child.tag == 'Activate' and activate == None:
+                activate = child
 
-    for object in objects:
         object_names = []
-        if object.find('DisplayId') != None: # include the DisplayId if there is one
-            if not object.find('DisplayId').text in parsed.keys(): # for shinies overriding normal items
-                object_names.append(object.find('DisplayId').text)
+        if display_id != None: # include the DisplayId if there is one
+            if not display_id.text in parsed.keys(): # for shinies overriding normal items
+                object_names.append(display_id.text)
 
         object_names.append(object.attrib['id'])
 
-        for texture_type in ('Texture', 'AnimatedTexture'): # check if there is a Texture or AnimatedTexture tree, define texture as whichever tree is found
-            if (texture := object.find(texture_type)):
-                break
-        else: # if neither is found, this object shouldn't be parsed (it has no texture)
+        if texture == None or len(texture) == 0: # check if there is a Texture or AnimatedTexture tree (with children), prefer Texture
+            texture = animated_texture
+        if texture == None or len(texture) == 0: # if neither is found, this object shouldn't be parsed (it has no texture)
             continue
 
         file, index_text = texture[0].text, texture[1].text # texture[0] should contain the sheet name, texture[1] should contain the index
@@ -110,7 +261,6 @@ def parse_xml(path: str, write = True) -> dict[str:str | int]:
         else:
             quantity = 0
         
-        activate = object.find('Activate')
         contained_items = []
         if activate != None and activate.text == 'UnlockForgeBlueprint':
             contained_items = activate.attrib['id'].split(',')
@@ -129,85 +279,241 @@ def parse_xml(path: str, write = True) -> dict[str:str | int]:
     
     return parsed
 
-# parses all xml and merges json files into one (master.json)
-def parse_all() -> None:
-    files = os.listdir('./bin/xml')
+# parse_xml in a pool worker (it writes the file's json too), with its perf_counter start and end for parse_all's timings
+def _parse_xml_in_worker(path: str) -> tuple[dict[str:str | int], float, float]:
+    start = time.perf_counter()
+    parsed = parse_xml(path)
+    return parsed, start, time.perf_counter()
+
+# parses all xml and merges json files into one (master.json), returns the seconds each parsed file took
+# files whose content hash matches manifest.json are loaded from their json instead of being parsed again, the rest are parsed on all cores
+# merged in os.listdir order whichever file finishes first, so later files override earlier ones (custom items included) like before
+# setting cancel_event (a cancelled update) stops it between files, before anything is written; it then returns {}
+@instrument.timed('Parse All')
+def parse_all(cancel_event: threading.Event | None = None) -> dict[str: float]:
+    files = [file for file in os.listdir('./bin/xml') if file.endswith('.xml')] # anything else (like .part files left by older versions) isn't xml to merge
+
+    try:
+        with open('./bin/json/manifest.json', 'r') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = {}
     
-    master_dict = {}
+    new_manifest = {}
+    parsed_files = {}
+    files_to_parse = []
+    changed = not os.path.exists('./bin/json/master.json')
     
     for file in files:
-        parsed = parse_xml(f'./bin/xml/{file}')
+        if cancel_event != None and cancel_event.is_set():
+            return {}
+
+        xml_path = f'./bin/xml/{file}'
+        json_path = f'./bin/json/{file.removesuffix(".xml")}.json'
+        mtime = os.path.getmtime(xml_path)
+        entry = manifest.get(file)
+
+        if entry != None and entry['Mtime'] == mtime and os.path.exists(json_path): # unchanged mtime, skip hashing too
+            content_hash = entry['Hash']
+        else:
+            with open(xml_path, 'rb') as f:
+                content_hash = hashlib.sha256(f.read()).hexdigest()
+
+        if entry != None and entry['Hash'] == content_hash and os.path.exists(json_path):
+            with open(json_path, 'r') as f:
+                parsed_files[file] = json.load(f)
+            instrument.count('XML Files Reused')
+        else:
+            files_to_parse.append(file)
+            instrument.count('XML Files Parsed')
+            changed = True
+
+        new_manifest[file] = {'Hash': content_hash, 'Mtime': mtime}
+
+    parse_seconds = {}
+
+    worker_count = min(os.cpu_count() or 1, len(files_to_parse))
+
+    if worker_count > 1: # a single worker would only add process start up and copying the results back
+        # spawned, not forked: this runs on the update thread while the ui and preview threads may hold locks (render's caches,
+        # instrument) that a forked worker would start with held and never get back
+        with concurrent.futures.ProcessPoolExecutor(max_workers = worker_count, mp_context = multiprocessing.get_context('spawn')) as executor:
+            biggest_first = sorted(files_to_parse, key = lambda file: -os.path.getsize(f'./bin/xml/{file}')) # so the slowest file doesn't start last
+            futures = {file: executor.submit(_parse_xml_in_worker, f'./bin/xml/{file}') for file in biggest_first}
+            results = {}
+            for file, future in futures.items():
+                while file not in results:
+                    if cancel_event != None and cancel_event.is_set():
+                        executor.shutdown(wait = False, cancel_futures = True) # the rest never start, leaving the with waits for the files already being parsed
+                        return {}
+                    try:
+                        results[file] = future.result(timeout = 0.1)
+                    except concurrent.futures.TimeoutError:
+                        pass
+    else:
+        results = {}
+        for file in files_to_parse:
+            if cancel_event != None and cancel_event.is_set():
+                return {}
+            results[file] = _parse_xml_in_worker(f'./bin/xml/{file}')
+
+    if cancel_event != None and cancel_event.is_set(): # last chance, master.json and the manifest are written below
+        return {}
+
+    for file in files_to_parse:
+        parsed_files[file], start, end = results[file]
+        parse_seconds[file] = end - start
+        instrument.record(f'Parse {file}', start, end)
+
+    master_dict = {}
+    for file in files:
+        master_dict.update(parsed_files.pop(file)) # in place, same last-file-wins order as merging with |
+
+    if new_manifest.keys() != manifest.keys(): # files were added or removed
+        changed = True
+
+    if changed:
+        with instrument.stage('Write Master'), open('./bin/json/master.json', 'w') as f:
+            json.dump(master_dict, f, ensure_ascii=False) # not indented, master.json is only read by the program
+
+    if get_config()['Master Backend'] == 'sqlite' and (changed or database.get_master_database_path() == None):
+        with instrument.stage('Build Master Database'):
+            database.build_master_database(master_dict)
+
+    with open('./bin/json/manifest.json', 'w') as f:
+        json.dump(new_manifest, f, indent=4, ensure_ascii=False)
+
+    return parse_seconds
+
+# sheets used by the master dict, without custom sheets since those aren't downloaded
+def get_sheet_names(master_dict: dict[str:str | int] | database.MasterDatabase) -> set[str]:
+    if isinstance(master_dict, database.MasterDatabase): # stored when the database was built
+        sheets = master_dict.sheets()
+
+    else:
+        sheets = set() # {} is interpreted as an empty dict before an empty set
         
-        master_dict = master_dict | parsed
+        for key in master_dict:
+            sheets.add(master_dict[key]['File'])
     
-    with open('./bin/json/master.json', 'w') as f:
-        json.dump(master_dict, f, indent=4, ensure_ascii=False)   
+    return sheets - render.CUSTOM_SHEETS # exception for custom items
 
-# fills sheets folder with url from config file and master.json (needs master.json, use after parse_all)
-async def download_sheets_async(session: aiohttp.ClientSession) -> None:
-    # first part for getting required sheets to not download all of them
-    sheets = set() # {} is interpreted as an empty dict before an empty set
+# downloads sheets with url from config file and master_dict (from get_master_dict, use after parse_all; staged, see download), returns the names of sheets that changed
+async def download_sheets_async(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, validators: dict[str: dict[str: str]], staged: list[tuple], progress: UpdateProgress, master_dict: dict[str:str | int] | database.MasterDatabase) -> list[str]:
+    import asyncio
 
-    master_dict = get_master_dict()
-    
-    for key in master_dict:
-        sheets.add(master_dict[key]['File'])
-    
-    if 'custom8x8' in sheets: # exception for custom items
-        sheets.remove('custom8x8')
-    if 'custom16x16' in sheets:
-        sheets.remove('custom16x16')
-    if 'custom32x32' in sheets:
-        sheets.remove('custom32x32')
-
-    # this part is similar to download_xml()
-    with open('./bin/config.json', 'r') as f:
-        config = json.load(f)
+    sheets = sorted(get_sheet_names(master_dict)) # only required sheets to not download all of them
+
+    # this part is similar to download_xml_async()
+    config = get_config()
+    progress.start_stage('Downloading sheets', len(sheets))
     
     tasks = []
 
     for sheet in sheets:
-        tasks.append(fetch(session, f'{config["Sheet URL"]}{sheet}.png'))
-    contents = await asyncio.gather(*tasks)
+        tasks.append(download(session, f'{config["Sheet URL"]}{sheet}.png', f'./bin/sheets/{sheet}.png', semaphore, validators, config['Download Retries'], staged, progress))
+    changed = await asyncio.gather(*tasks)
+
+    return [sheet for sheet, sheet_changed in zip(sheets, changed) if sheet_changed]
+
+# function(*args, cancel_event = ...) on a thread, like asyncio.to_thread; cancelling the await sets cancel_event and waits for function to
+# notice it and stop, so a cancelled update can't keep writing master.json or deleting sheets after it has said it was cancelled
+async def _to_cancellable_thread(function, *args):
+    import asyncio
 
-    for content, sheet in zip(contents, sheets):
-        with open(f'./bin/sheets/{sheet}.png', 'wb') as f:
-            f.write(content)
+    cancel_event = threading.Event()
+    thread_future = asyncio.ensure_future(asyncio.to_thread(function, *args, cancel_event = cancel_event))
 
-# downloads xml, parses it, downloads sheets
-async def setup() -> None:
-    async with aiohttp.ClientSession() as session:
-        await download_xml_async(session)
-        parse_all()
-        await download_sheets_async(session)
+    try:
+        return await asyncio.shield(thread_future)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        await asyncio.wait([thread_future]) # whatever it returns or raises once stopped doesn't matter anymore
+        raise
+
+# downloads xml, parses it, downloads sheets; steps are skipped when everything they depend on was unchanged (304)
+# progress_callback(text, fraction) gets per-file progress; the update can be cancelled like any task, files only change once each step completes
+async def setup(progress_callback = None) -> None:
+    import aiohttp, asyncio
+
+    config = get_config()
+    validators = get_validators()
+    semaphore = asyncio.Semaphore(config['Download Concurrency'])
+    progress = UpdateProgress(progress_callback)
+    staged = []
+    changed_sheets = []
+    master_dict = None
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            with instrument.stage('Download XML'):
+                changed_xml = await download_xml_async(session, semaphore, validators, staged, progress)
+
+            sheets_pending = os.path.exists('./bin/json/sheets.pending') # last update changed the xml but never finished parsing, its sheets or the atlas
+            if changed_xml:
+                open('./bin/json/sheets.pending', 'w').close()
+                commit_downloads(staged, validators)
+
+            master_missing = not os.path.exists('./bin/json/master.json')
+            if changed_xml or master_missing or sheets_pending: # parse_all only parses files that changed since it last finished
+                progress.message('Parsing xml')
+                start = time.perf_counter()
+                parse_seconds = await _to_cancellable_thread(parse_all)
+                slowest = ', '.join(f'{file} {seconds:.1f}s' for file, seconds in sorted(parse_seconds.items(), key = lambda item: -item[1])[:3])
+                progress.message(f'Parsed xml in {time.perf_counter() - start:.1f}s' + (f' (slowest: {slowest})' if slowest else ''))
+
+            master_dict = get_master_dict() # one for every step below, opened after parse_all since that builds a new master database
+            sheets_missing = any(not render.has_sheet(sheet) for sheet in get_sheet_names(master_dict)) # sheets packed into the atlas count as there
+            if changed_xml or sheets_pending or master_missing or sheets_missing:
+                with instrument.stage('Download Sheets'):
+                    changed_sheets = await download_sheets_async(session, semaphore, validators, staged, progress, master_dict)
+                commit_downloads(staged, validators)
+
+            if config['Sprite Atlas'] and (changed_sheets or changed_xml or sheets_pending or not os.path.exists('./bin/atlas/atlas.json')):
+                progress.message('Building sprite atlas')
+                await _to_cancellable_thread(render.build_sprite_atlas, master_dict, config['Keep Sheets'])
+
+            if os.path.exists('./bin/json/sheets.pending'):
+                os.remove('./bin/json/sheets.pending')
+
+    finally: # keep validators of whatever finished (and .part files of whatever didn't), even if cancelled or failed
+        save_validators(validators)
+        close_master_dict(master_dict)
+
+    if changed_sheets:
+        render.clear_caches() # sheets were replaced, decoded sheets and renders are stale
+
+    progress.message('Update finished')
 
 # returns a dict with keys "File", "Index", "Size", "Quantity"; "File" is a string, the rest are ints
-def get_master_dict() -> dict[str:str | int]:
+# with 'Master Backend' set to sqlite this is a MasterDatabase instead, which is looked up the same way
+def get_master_dict() -> dict[str:str | int] | database.MasterDatabase:
+    if get_config()['Master Backend'] == 'sqlite':
+        if database.get_master_database_path() == None: # made from master.json the first time
+            with open('./bin/json/master.json', 'r') as f:
+                database.build_master_database(json.load(f))
+        return database.MasterDatabase()
+
     with open('./bin/json/master.json', 'r') as f:
         master_dict = json.load(f)
     return master_dict
 
+# for callers done with a get_master_dict result, closes its connection when it's a MasterDatabase (json dicts need nothing)
+def close_master_dict(master_dict: dict[str:str | int] | database.MasterDatabase | None) -> None:
+    if isinstance(master_dict, database.MasterDatabase):
+        master_dict.close()
+
+# the config shared by every module (read once, see settings)
 def get_config() -> dict[str: str| int]:
-    with open('./bin/config.json', 'r') as f:
-        config = json.load(f)
-    return config
+    return settings.config
 
 # updates 1 key with a new value
 def update_config(key:str, value: str | int):
-    config = get_config()
-
-    config[key] = value
-
-    with open('./bin/config.json', 'w') as f:
-        json.dump(config, f, indent = 4, ensure_ascii = False)
+    settings.update_config(key, value)
 
 # possibly redundant
 # for toggling config options between 1 and 0
 def toggle_config_option(key: str):
     config = get_config()
 
-    if config[key] == 1: config[key] = 0
-    else: config[key] = 1
-    
-    with open('./bin/config.json', 'w') as f:
-        json.dump(config, f, indent = 4, ensure_ascii = False)
\ No newline at end of file
+    settings.update_config(key, 0 if config[key] == 1 else 1)
\ No newline at end of file
@@ -1,20 +1,197 @@
 import PIL.Image as Img
-import PIL.ImageFilter as Filter
-import PIL.ImageDraw as Draw
-import PIL.ImageFont as Font
-import json
+import array, collections, concurrent.futures, hashlib, json, mmap, multiprocessing, os, threading, time
+import bin.helpers.instrument as instrument
+import bin.helpers.settings as settings
 
-with open('./bin/config.json', 'r') as f:
-    config = json.load(f)
+# PIL.ImageFilter, ImageDraw and ImageFont are imported where they're used so they aren't loaded before the first render
+
+config = settings.config
 
 UPSCALE = config['Upscale']
 LARGE_SIZE = config['Large Size']
 SMALL_SIZE = config['Small Size']
 BLUEPRINT_SIZE = config['Blueprint Size']
 QUANTITY_FONTSIZE = config['Quantity Font Size']
+SHEET_CACHE_SIZE = config['Sheet Cache Size'] # in bytes
+SPRITE_CACHE_SIZE = config['Sprite Cache Size'] # in sprites
+SPRITE_DISK_CACHE = config['Sprite Disk Cache']
+QUEST_DISK_CACHE = config['Quest Disk Cache'] # finished quest panels in bin/cache/quests, see get_quest_cache_path
+DISK_CACHE_SIZE = config['Disk Cache Size'] # in bytes, of both disk caches together, see prune_disk_caches
+PARALLEL_RENDER = config['Parallel Render']
+SPRITE_ATLAS = config['Sprite Atlas']
+KEEP_SHEETS = config['Keep Sheets']
+OUTPUT_FORMAT = config['Output Format'] # png or webp (always lossless)
+PNG_COMPRESS_LEVEL = config['PNG Compress Level'] # 0 (fastest, biggest) to 9
+PNG_OPTIMIZE = config['PNG Optimize'] # extra compression pass, slow
+PNG_QUANTIZE = config['PNG Quantize'] # palette png when the image has 256 colours or less, never changes a pixel
+
+OUTPUT_EXTENSIONS = {'png': '.png', 'webp': '.webp'}
+WEBP_MAX_SIZE = 16383 # in pixels, either side
+
+DISK_CACHE_FOLDERS = ('./bin/cache/sprites', './bin/cache/quests')
+
+# part of every quest cache key, bump it whenever a change to the rendering code changes what a quest looks like
+RENDER_VERSION = 2
+
+# files a quest panel is drawn from besides the sprites and its frequency icon
+ASSET_FILES = ['./bin/template.png', './bin/title.ttf', './bin/quantity.ttf', './bin/icons/Chooseable.png']
+
+CUSTOM_SHEETS = {'custom8x8', 'custom16x16', 'custom32x32'} # edited by users, so never downloaded or packed into the atlas
+
+# decoded RGBA sheets, keyed by (sheet name, mtime); least recently used sheets are dropped first once the byte limit is passed
+_sheet_cache = collections.OrderedDict()
+_sheet_cache_bytes = 0
+
+# finished sprite renders, keyed by everything that changes the output (see get_rendered_sprite)
+_sprite_cache = collections.OrderedDict()
+
+# display-size copies of finished sprites (group tiles and blueprint contents), keyed by the sprite's key and the size (see get_tile)
+_tile_cache = collections.OrderedDict()
+TILE_CACHE_SIZE = SPRITE_CACHE_SIZE * 3 # large, small and blueprint tiles
+
+# memory mapped sprite atlas (see build_sprite_atlas), opened on first use
+_atlas = None
+
+_cache_lock = threading.RLock() # the live preview renders on its own thread
+
+# hits and misses of the caches above, always counted (the render service reports them); instrument only records them when it's enabled
+cache_stats = collections.Counter()
+
+def _count_cache(name: str) -> None:
+    with _cache_lock:
+        cache_stats[name] += 1
+    instrument.count(name)
+
+# fonts, template and icons used by every render, each loaded the first time it's needed and then shared (never draw onto them, copy first)
+# reload() drops them so edited files are picked up without restarting; config isn't read again, like every other option it needs a restart
+class RenderAssets:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.quantity_font_size = QUANTITY_FONTSIZE
+        self._template = None
+        self._title_font = None
+        self._quantity_font = None
+        self._icons = {}
+
+    def reload(self) -> None:
+        with self._lock:
+            self._template = None
+            self._title_font = None
+            self._quantity_font = None
+            self._icons = {}
+
+    @property
+    def template(self) -> Img.Image:
+        template = self._template
+        if template == None:
+            with self._lock, instrument.stage('Load Template'):
+                if self._template == None:
+                    self._template = Img.open('./bin/template.png').convert('RGBA')
+                template = self._template
+        return template
+
+    @property
+    def title_font(self):
+        import PIL.ImageFont as Font
+
+        title_font = self._title_font
+        if title_font == None:
+            with self._lock, instrument.stage('Load Title Font'):
+                if self._title_font == None:
+                    self._title_font = Font.truetype('./bin/title.ttf', 26)
+                title_font = self._title_font
+        return title_font
+
+    @property
+    def quantity_font(self):
+        import PIL.ImageFont as Font
+
+        quantity_font = self._quantity_font
+        if quantity_font == None:
+            with self._lock, instrument.stage('Load Quantity Font'):
+                if self._quantity_font == None:
+                    self._quantity_font = Font.truetype('./bin/quantity.ttf', self.quantity_font_size)
+                quantity_font = self._quantity_font
+        return quantity_font
+
+    # frequency icons and Chooseable, by file name without .png
+    def icon(self, name: str) -> Img.Image:
+        icons = self._icons
+        if name not in icons:
+            with self._lock, instrument.stage('Load Icons'):
+                if name not in self._icons:
+                    self._icons[name] = Img.open(f'./bin/icons/{name}.png').convert('RGBA')
+                icons = self._icons
+        return icons[name]
+
+assets = RenderAssets()
+
+def clear_sheet_cache() -> None:
+    global _sheet_cache_bytes
+
+    with _cache_lock:
+        _sheet_cache.clear()
+        _sheet_cache_bytes = 0
+
+def clear_sprite_cache() -> None:
+    with _cache_lock:
+        _sprite_cache.clear()
+        _tile_cache.clear()
+
+def close_atlas() -> None:
+    global _atlas
+
+    with _cache_lock:
+        if _atlas != None:
+            _atlas['Map'].close()
+            _atlas['File'].close()
+            _atlas = None
+
+# disk tier is left alone, its keys include the sheet mtime so old renders are never picked up again
+def clear_caches() -> None:
+    clear_sheet_cache()
+    clear_sprite_cache()
+    close_atlas()
+    assets.reload()
+
+# returns the whole sheet as RGBA, only decoding the png if it changed since it was cached
+def get_sheet(sheet_name: str) -> Img.Image:
+    global _sheet_cache_bytes
+
+    with _cache_lock:
+        path = f'./bin/sheets/{sheet_name}.png'
+        key = (sheet_name, os.path.getmtime(path))
+
+        if key in _sheet_cache:
+            _sheet_cache.move_to_end(key)
+            _count_cache('Sheet Cache Hits')
+            return _sheet_cache[key]
+
+        _count_cache('Sheet Cache Misses')
+        with instrument.stage('Decode Sheet'):
+            sheet = Img.open(path).convert('RGBA')
+        sheet_bytes = sheet.size[0] * sheet.size[1] * 4
+
+        for old_key in [old_key for old_key in _sheet_cache if old_key[0] == sheet_name]: # older versions of the same sheet can't be used again
+            old_sheet = _sheet_cache.pop(old_key)
+            _sheet_cache_bytes -= old_sheet.size[0] * old_sheet.size[1] * 4
+
+        _sheet_cache[key] = sheet
+        _sheet_cache_bytes += sheet_bytes
+
+        while _sheet_cache_bytes > SHEET_CACHE_SIZE and len(_sheet_cache) > 1: # always keep the sheet that was just loaded
+            _, old_sheet = _sheet_cache.popitem(last = False)
+            _sheet_cache_bytes -= old_sheet.size[0] * old_sheet.size[1] * 4
+
+        return sheet
 
 def get_sprite_from_sheet(sheet_name: str, index: int, size: int) -> Img.Image:
-    sheet = Img.open(f'./bin/sheets/{sheet_name}.png')
+    atlas_sprite = _get_atlas_sprite(sheet_name, index, size)
+    if atlas_sprite != None:
+        _count_cache('Atlas Sprites')
+        return atlas_sprite
+
+    sheet = get_sheet(sheet_name)
 
     column_count = int(sheet.size[0] / size) # should always be divisble w/o remainder
     column = index % column_count
@@ -23,31 +200,143 @@ def get_sprite_from_sheet(sheet_name: str, index: int, size: int) -> Img.Image:
     top_left = (column * size, row * size)
     bottom_right = (column * size + size, row * size + size)
 
-    return sheet.crop((*top_left, *bottom_right)).convert('RGBA')
+    return sheet.crop((*top_left, *bottom_right))
+
+def _get_atlas() -> dict | None:
+    global _atlas
+
+    if not SPRITE_ATLAS:
+        return None
+
+    with _cache_lock:
+        if _atlas == None and os.path.exists('./bin/atlas/atlas.json'):
+            with open('./bin/atlas/atlas.json', 'r') as f:
+                atlas_index = json.load(f)
+
+            atlas_file = open(f'./bin/atlas/{atlas_index["File"]}', 'rb')
+            if os.fstat(atlas_file.fileno()).st_size == 0: # mmap can't map empty files
+                atlas_file.close()
+                return None
+
+            _atlas = {
+                'Sprites': atlas_index['Sprites'], # 'sheet:index:size' -> byte offset of the raw RGBA sprite
+                'Sheets': atlas_index['Sheets'], # sheet name -> mtime of the sheet when it was packed
+                'File': atlas_file,
+                'Map': mmap.mmap(atlas_file.fileno(), 0, access = mmap.ACCESS_READ)
+            }
+
+        return _atlas
+
+# sprite straight from the atlas (no png decoding), None if it isn't packed or its sheet changed since
+def _get_atlas_sprite(sheet_name: str, index: int, size: int) -> Img.Image | None:
+    atlas = _get_atlas()
+    if atlas == None or sheet_name not in atlas['Sheets']:
+        return None
+
+    sheet_path = f'./bin/sheets/{sheet_name}.png'
+    if os.path.exists(sheet_path) and os.path.getmtime(sheet_path) != atlas['Sheets'][sheet_name]:
+        return None
+
+    offset = atlas['Sprites'].get(f'{sheet_name}:{index}:{size}')
+    if offset == None:
+        return None
+
+    with _cache_lock: # the map could be closed by clear_caches otherwise
+        if atlas['Map'].closed:
+            return None
+        return Img.frombytes('RGBA', (size, size), atlas['Map'][offset:offset + size * size * 4])
+
+# mtime of the sheet, or of the sheet that was packed into the atlas if the sheet was deleted
+def get_sheet_version(sheet_name: str) -> float:
+    sheet_path = f'./bin/sheets/{sheet_name}.png'
+    if os.path.exists(sheet_path):
+        return os.path.getmtime(sheet_path)
+
+    atlas = _get_atlas()
+    if atlas != None and sheet_name in atlas['Sheets']:
+        return atlas['Sheets'][sheet_name]
+
+    raise FileNotFoundError(sheet_path)
+
+def has_sheet(sheet_name: str) -> bool:
+    try:
+        get_sheet_version(sheet_name)
+        return True
+    except FileNotFoundError:
+        return False
+
+# crops every sprite the master dict uses (except custom ones) into one raw RGBA file + an offset index in bin/atlas
+# sprites are then read with a slice of a memory map instead of decoding sheets; keep_sheets = 0 deletes the packed sheets afterwards
+# setting cancel_event (a cancelled update) stops it between sprites, keeping the current atlas and every sheet
+@instrument.timed('Build Sprite Atlas')
+def build_sprite_atlas(master_dict: dict[str: str | int], keep_sheets = KEEP_SHEETS, cancel_event: threading.Event | None = None) -> None:
+    sprites = sorted({(item_dict['File'], item_dict['Index'], item_dict['Size']) for item_dict in master_dict.values() if item_dict['File'] not in CUSTOM_SHEETS})
+
+    os.makedirs('./bin/atlas', exist_ok = True)
+    atlas_file_name = f'atlas-{time.time_ns()}.rgba' # new name every build, windows can't replace a file that is memory mapped
+    sprite_offsets = {}
+    sheet_versions = {}
+
+    with open(f'./bin/atlas/{atlas_file_name}', 'wb') as f:
+        for sheet_name, index, size in sprites:
+            if cancel_event != None and cancel_event.is_set():
+                break
+
+            if not has_sheet(sheet_name): # sheets that failed to download
+                continue
+
+            sprite = get_sprite_from_sheet(sheet_name, index, size) # from the old atlas if the sheet was deleted
+            sheet_versions[sheet_name] = get_sheet_version(sheet_name)
+            sprite_offsets[f'{sheet_name}:{index}:{size}'] = f.tell()
+            f.write(sprite.tobytes())
+
+    if cancel_event != None and cancel_event.is_set(): # a cancelled update, the current atlas and sheets stay as they are
+        os.remove(f'./bin/atlas/{atlas_file_name}')
+        return
+
+    with open('./bin/atlas/atlas.json.tmp', 'w') as f:
+        json.dump({'File': atlas_file_name, 'Sheets': sheet_versions, 'Sprites': sprite_offsets}, f, ensure_ascii = False)
+    os.replace('./bin/atlas/atlas.json.tmp', './bin/atlas/atlas.json')
+
+    close_atlas()
+
+    for file_name in os.listdir('./bin/atlas'): # older builds
+        if file_name.endswith('.rgba') and file_name != atlas_file_name:
+            try:
+                os.remove(f'./bin/atlas/{file_name}')
+            except OSError: # still mapped by another process, removed on the next build
+                pass
+
+    if not keep_sheets:
+        for sheet_name in sheet_versions:
+            if os.path.exists(f'./bin/sheets/{sheet_name}.png'): # could have been deleted by an earlier build
+                os.remove(f'./bin/sheets/{sheet_name}.png')
+        clear_sheet_cache()
 
 def create_silhouette(image: Img.Image) -> Img.Image:
-    x = image.size[0]
     silhouette = image.copy()
 
-    for i, pixel in enumerate(image.getdata()):
-        position = (i % x, i // x) # column, row
-        if pixel[3] != 0: # put black pixels on pixels with non-zero alpha values
-            silhouette.putpixel(position, (0, 0, 0, 255))
+    opaque_mask = image.getchannel('A').point(lambda alpha: 255 if alpha != 0 else 0) # whole-image mask instead of a putpixel per pixel
+    silhouette.paste((0, 0, 0, 255), mask = opaque_mask) # put black pixels on pixels with non-zero alpha values, fully transparent pixels are kept as is
 
     return silhouette
 
 # upscale, shadow, outline, and quantity; upscale is 1 pixel in original image -> upscale# of pixels in final image
+@instrument.timed('Render Sprite')
 def render_one_sprite(image: Img.Image, quantity: int, upscale=UPSCALE) -> Img.Image:
+    import PIL.ImageDraw as Draw, PIL.ImageFilter as Filter
+
     width, height = image.size # width and height are in unaltered pixels (ie 8x8 or 16x16)
 
     base_image = Img.new('RGBA', ((width + 2) * upscale, (height + 2) * upscale), (0, 0, 0, 0)) # transparent bg w/ a 1 pixel margin on all sides
 
     silhouette = create_silhouette(image).resize((width * upscale, height * upscale), resample = Img.BOX)
 
-    base_image.alpha_composite(silhouette, (upscale, upscale))
-    base_image = base_image.filter(Filter.GaussianBlur(radius = upscale / 2)) # blur silhouette to make the shadow
-    base_image.alpha_composite(silhouette, (upscale, upscale))
-    base_image = base_image.filter(Filter.GaussianBlur(radius = upscale / 4)) # do it twice to make it darker (better  way???) 
+    with instrument.stage('Sprite Shadow'):
+        base_image.alpha_composite(silhouette, (upscale, upscale))
+        base_image = base_image.filter(Filter.GaussianBlur(radius = upscale / 2)) # blur silhouette to make the shadow
+        base_image.alpha_composite(silhouette, (upscale, upscale))
+        base_image = base_image.filter(Filter.GaussianBlur(radius = upscale / 4)) # do it twice to make it darker (better  way???) 
 
     for i in (-1, 1):
         for j in (-1, 1):
@@ -62,7 +351,7 @@ def render_one_sprite(image: Img.Image, quantity: int, upscale=UPSCALE) -> Img.I
     base_image_draw.fontmode = '1'
 
     # rendering this number before resizing sometimes makes artifacts in the number's outline, but they do not affect readability of the number or the sprite
-    image_font = Font.truetype('./bin/quantity.ttf', QUANTITY_FONTSIZE)
+    image_font = assets.quantity_font
 
     for i in (-1, 1):
         for j in (-1, 1):
@@ -71,26 +360,231 @@ def render_one_sprite(image: Img.Image, quantity: int, upscale=UPSCALE) -> Img.I
 
     return base_image
 
+# writes image to a disk cache path under a temporary name first and then renames it, so other processes
+# (the render service's workers, parallel render) never read a half written file while they save the same image
+def save_to_disk_cache(image: Img.Image, cache_path: str, **options) -> None:
+    os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+    temporary_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    try:
+        image.save(temporary_path, 'PNG', **options)
+        os.replace(temporary_path, cache_path)
+    except OSError: # the cache is only a shortcut, a full disk or a locked file (windows) shouldn't fail the render
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+# marks a disk cache file as just used, prune_disk_caches deletes the least recently used ones first
+def touch_disk_cache(cache_path: str) -> None:
+    try:
+        os.utime(cache_path)
+    except OSError: # pruned or deleted meanwhile, the image was already read
+        pass
+
+# deletes the least recently used files of both disk caches until they fit in max_bytes, returns how many were deleted
+# cache keys include file versions, so every update leaves the previous renders behind unread; this is what removes them
+# .tmp files older than a minute are left by saves that were killed part way and are deleted too
+def prune_disk_caches(max_bytes: int = DISK_CACHE_SIZE) -> int:
+    cache_files = []
+    now = time.time()
+
+    for folder in DISK_CACHE_FOLDERS:
+        if not os.path.isdir(folder):
+            continue
+
+        for file in os.listdir(folder):
+            path = f'{folder}/{file}'
+            try:
+                file_stat = os.stat(path)
+                if file.endswith('.tmp'):
+                    if now - file_stat.st_mtime > 60:
+                        os.remove(path)
+                    continue
+            except OSError: # another process deleted or replaced it meanwhile
+                continue
+
+            cache_files.append((file_stat.st_mtime, file_stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in cache_files)
+    removed = 0
+
+    for _, size, path in sorted(cache_files): # oldest first
+        if total_size <= max_bytes:
+            break
+
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+
+        total_size -= size
+        removed += 1
+
+    return removed
+
+# everything that changes the output of get_rendered_sprite
+def get_sprite_key(item_dict: dict[str: str | int], upscale=UPSCALE) -> tuple:
+    return (item_dict['File'], get_sheet_version(item_dict['File']), item_dict['Index'], item_dict['Size'], item_dict['Quantity'], upscale, assets.quantity_font_size)
+
+# same as render_one_sprite(get_sprite_from_sheet(...)), but reuses earlier renders from memory or bin/cache/sprites
+def get_rendered_sprite(item_dict: dict[str: str | int], upscale=UPSCALE) -> Img.Image:
+    key = get_sprite_key(item_dict, upscale)
+
+    with _cache_lock:
+        if key in _sprite_cache:
+            _sprite_cache.move_to_end(key)
+            _count_cache('Sprite Cache Hits')
+            return _sprite_cache[key].copy() # copy since callers paste blueprint contents onto the sprite
+
+    sprite = None
+
+    if SPRITE_DISK_CACHE:
+        cache_path = f'./bin/cache/sprites/{hashlib.sha1(repr(key).encode()).hexdigest()}.png'
+
+        try:
+            with Img.open(cache_path) as cached_image:
+                sprite = cached_image.convert('RGBA')
+            _count_cache('Sprite Disk Cache Hits')
+            touch_disk_cache(cache_path)
+        except OSError: # missing or unreadable (the cache folder can be deleted at any time), rendered again and rewritten below
+            sprite = None
+
+    if sprite == None:
+        _count_cache('Sprite Cache Misses')
+        sprite = render_one_sprite(get_sprite_from_sheet(item_dict['File'], item_dict['Index'], item_dict['Size']), item_dict['Quantity'], upscale = upscale)
+
+        if SPRITE_DISK_CACHE:
+            with instrument.stage('Save Sprite To Disk Cache'):
+                save_to_disk_cache(sprite, cache_path)
+
+    with _cache_lock:
+        _sprite_cache[key] = sprite
+        if len(_sprite_cache) > SPRITE_CACHE_SIZE:
+            _sprite_cache.popitem(last = False)
+
+    return sprite.copy()
+
+# image_function() resized to size x size, kept so each sprite is resized once per size class; key identifies image_function's output
+# shared between quests, don't draw onto it
+def get_tile(key: tuple, image_function, size: int) -> Img.Image:
+    with _cache_lock:
+        if (key, size) in _tile_cache:
+            _tile_cache.move_to_end((key, size))
+            _count_cache('Tile Cache Hits')
+            return _tile_cache[(key, size)]
+
+    _count_cache('Tile Cache Misses')
+    tile = image_function().resize((size, size), resample = Img.BOX)
+
+    with _cache_lock:
+        _tile_cache[(key, size)] = tile
+        if len(_tile_cache) > TILE_CACHE_SIZE:
+            _tile_cache.popitem(last = False)
+
+    return tile
+
+# a blueprint's content: rendered at half upscale, then shrunk to BLUEPRINT_SIZE
+def get_contained_tile(master_dict: dict[str: str | int], name: str) -> Img.Image:
+    item_dict = master_dict[name]
+    return get_tile(get_sprite_key(item_dict, upscale = UPSCALE // 2), lambda: get_rendered_sprite(item_dict, upscale = UPSCALE // 2), BLUEPRINT_SIZE)
+
+@instrument.timed('Paste Blueprint Contents')
 def paste_contained_item(master_dict: dict[str: str | int], base_image: Img.Image, contained_names: list[str]) -> None:
-    for index, contained_name in enumerate(contained_names):
-        item_dict = master_dict[contained_name]
-        contained_image = render_one_sprite(get_sprite_from_sheet(item_dict['File'], item_dict['Index'], item_dict['Size']), item_dict['Quantity'], upscale = UPSCALE // 2)
-        contained_image.resize((BLUEPRINT_SIZE, BLUEPRINT_SIZE))
-        base_image.alpha_composite(contained_image, (0,(base_image.size[0] - BLUEPRINT_SIZE) // len(contained_names) * index))
+    paste_contained_images(base_image, [get_contained_tile(master_dict, contained_name) for contained_name in contained_names])
+
+# contained_images are the blueprint's contents from get_contained_tile, stacked down the left side
+def paste_contained_images(base_image: Img.Image, contained_images: list[Img.Image]) -> None:
+    for index, contained_image in enumerate(contained_images):
+        base_image.alpha_composite(contained_image, (0,(base_image.size[0] - BLUEPRINT_SIZE) // len(contained_images) * index))
+
+# the distinct sprites a list of entries needs, so each is rendered once per infographic however many quests use it
+# keys are (name, upscale, role): role 'Item' is a quest item with its blueprint contents pasted on, 'Contained' is a blueprint's content (as its tile)
+# with Quest Disk Cache on it also looks up each entry's finished panel in bin/cache/quests, and entries found there need no sprites
+class RenderPlan:
+    def __init__(self, master_dict: dict[str: str | int], entries: list[dict[str: str | bool]]):
+        self.keys = {} # used as an ordered set
+        self.total_count = 0 # sprites the quests that aren't cached show, counting repeats
+        self.sprites = {}
+        self.quest_cache_paths = [None] * len(entries) # by entry index, None while the quest cache is off
+        self.cached_quests = set() # indexes of entries with a cached panel
+
+        if QUEST_DISK_CACHE:
+            asset_fingerprint = get_asset_fingerprint()
+            self.quest_cache_paths = [get_quest_cache_path(master_dict, entry, asset_fingerprint) for entry in entries]
+            self.cached_quests = {index for index, cache_path in enumerate(self.quest_cache_paths) if os.path.exists(cache_path)}
+
+        for index, entry in enumerate(entries):
+            if index in self.cached_quests:
+                continue
+
+            for name in entry['Input'] + entry['Output']:
+                self._add((name, UPSCALE, 'Item'))
+                for contained_name in master_dict[name]['Contained']:
+                    self._add((contained_name, UPSCALE // 2, 'Contained'))
+
+    def _add(self, key: tuple[str, int, str]) -> None:
+        self.keys[key] = None
+        self.total_count += 1
+
+    @property
+    def unique_count(self) -> int:
+        return len(self.keys)
+
+    @instrument.timed('Render Plan')
+    def render(self, master_dict: dict[str: str | int]) -> None:
+        for name, upscale, role in self.keys: # contents first, items paste them on below
+            if role == 'Contained':
+                self.sprites[(name, upscale, role)] = get_contained_tile(master_dict, name)
+
+        for name, upscale, role in self.keys:
+            if role == 'Item':
+                sprite = get_rendered_sprite(master_dict[name], upscale = upscale)
+                if master_dict[name]['Contained'] != []:
+                    paste_contained_images(sprite, [self.sprites[(contained_name, UPSCALE // 2, 'Contained')] for contained_name in master_dict[name]['Contained']])
+                self.sprites[(name, upscale, role)] = sprite
+
+        instrument.count('Plan Sprites', self.total_count)
+        instrument.count('Plan Unique Sprites', self.unique_count)
+
+    # shared between quests, don't draw onto it
+    def get_item_sprite(self, name: str) -> Img.Image:
+        return self.sprites[(name, UPSCALE, 'Item')]
+
+# finished sprite of a quest item (blueprint contents pasted on), from plan when there is one
+def get_item_sprite(master_dict: dict[str: str | int], name: str, plan: RenderPlan | None = None) -> Img.Image:
+    if plan != None:
+        return plan.get_item_sprite(name)
+
+    item_dict = master_dict[name]
+    sprite = get_rendered_sprite(item_dict)
+    if item_dict['Contained'] != []:
+        paste_contained_item(master_dict, sprite, item_dict['Contained'])
+
+    return sprite
+
+# key of get_item_sprite's output: the item's sprite and those of its blueprint contents
+def get_item_key(master_dict: dict[str: str | int], name: str) -> tuple:
+    item_dict = master_dict[name]
+    return (get_sprite_key(item_dict), tuple(get_sprite_key(master_dict[contained_name], upscale = UPSCALE // 2) for contained_name in item_dict['Contained']))
+
+# get_item_sprite at its size in an image group (see get_group_size)
+def get_item_tile(master_dict: dict[str: str | int], name: str, size: int, plan: RenderPlan | None = None) -> Img.Image:
+    return get_tile(get_item_key(master_dict, name), lambda: get_item_sprite(master_dict, name, plan), size)
+
+# items are shown large when they're alone, small otherwise
+def get_group_size(image_number: int) -> int:
+    return LARGE_SIZE if image_number < 2 else SMALL_SIZE
 
 # 160x80 with images centered in rows of 4
+@instrument.timed('Image Group')
 def generate_image_group(images: list[Img.Image]) -> Img.Image :
     image_number = len(images)
 
     if image_number > 8:
         raise Exception(f'Too many values in images: {images}')
-    elif image_number < 2:
-        render_size = LARGE_SIZE
-    else:
-        render_size = SMALL_SIZE
+    render_size = get_group_size(image_number)
 
     base_image = Img.new('RGBA', (160, 80), (0, 0, 0, 0))
-    sized_images = [image.resize((render_size, render_size), resample = Img.BOX) for image in images]
+    sized_images = [image if image.size == (render_size, render_size) else image.resize((render_size, render_size), resample = Img.BOX) for image in images] # tiles from get_item_tile are ready
 
     rows = []
     for i in range(image_number)[::4]: # every fourth -> one iteration per row
@@ -110,6 +604,7 @@ def generate_image_group(images: list[Img.Image]) -> Img.Image :
     return base_image
 
 # ignore margin should be 10 for infographics
+@instrument.timed('Combine Quests')
 def combine_images_vertically(images: list[Img.Image], ignore_margin: int) -> Img.Image:
     base_image_x = max([image.size[0] for image in images]) # highest width is base image width
     base_image_y = sum([image.size[1] for image in images]) - ignore_margin * (len(images) - 1) # total the height, but subtract each overlap
@@ -124,59 +619,230 @@ def combine_images_vertically(images: list[Img.Image], ignore_margin: int) -> Im
     
     return base_image
 
-# input should be the master dict and a list of dicts with keys 'Input', 'Output', 'Title', 'Icon', and 'Chooseable'
-def generate_infographic(master_dict: dict[str: str | int], entries: list[dict[str: str | bool]]) -> Img.Image:
-    template_image = Img.open('./bin/template.png').convert('RGBA')
+# canvas for quest_count panels of panel_size stacked like combine_images_vertically does, sized up front so
+# generate_infographic can place each panel as soon as it's rendered and drop it, instead of holding all of them
+def create_quest_canvas(panel_size: tuple[int, int], quest_count: int, ignore_margin: int) -> Img.Image:
+    return Img.new('RGBA', (panel_size[0], panel_size[1] * quest_count - ignore_margin * (quest_count - 1)), (0, 0, 0, 0))
+
+@instrument.timed('Place Quest')
+def place_quest(canvas: Img.Image, panel: Img.Image, position: int, ignore_margin: int) -> None:
+    canvas.paste(panel, (0, position * (panel.size[1] - ignore_margin))) # paste like combine_images_vertically, later panels cover the overlap
+
+# shared, render_quest draws onto a copy
+def load_template() -> Img.Image:
+    return assets.template
+
+# renders one quest panel onto a copy of the template; entry is a dict with keys 'Input', 'Output', 'Title', 'Icon', and 'Chooseable'
+# plan (a rendered RenderPlan covering entry) supplies the sprites, otherwise they're rendered here
+@instrument.timed('Render Quest')
+def render_quest(master_dict: dict[str: str | int], entry: dict[str: str | bool], template_image: Img.Image, plan: RenderPlan | None = None) -> Img.Image:
+    import PIL.ImageDraw as Draw
+
+    input_image_names = entry['Input'] # prefer to keep these separate, though it might look redundant
+    output_image_names = entry['Output'] # these are lists of names, the ui module separates them in app.get_quest_info
     
-    infographics = []
+    input_images = [get_item_tile(master_dict, name, get_group_size(len(input_image_names)), plan) for name in input_image_names]
+    output_images = [get_item_tile(master_dict, name, get_group_size(len(output_image_names)), plan) for name in output_image_names]
 
-    for entry in entries:
-        input_image_names = entry['Input'] # prefer to keep these separate, though it might look redundant
-        output_image_names = entry['Output'] # these are lists of names, the ui module separates them in app.get_quest_info
-        
-        input_images = []
-        output_images = []
-
-        for name in input_image_names:
-            item_dict = master_dict[name]
-            sprite = render_one_sprite(get_sprite_from_sheet(item_dict['File'], item_dict['Index'], item_dict['Size']), item_dict['Quantity'])
-            if item_dict['Contained'] != []:
-                paste_contained_item(master_dict, sprite, item_dict['Contained'])
-            input_images.append(sprite)
-        
-        for name in output_image_names:
-            item_dict = master_dict[name]
-            sprite = render_one_sprite(get_sprite_from_sheet(item_dict['File'], item_dict['Index'], item_dict['Size']), item_dict['Quantity'])
-            if item_dict['Contained'] != []:
-                paste_contained_item(master_dict, sprite, item_dict['Contained'])
-            output_images.append(sprite)
+    input_image = generate_image_group(input_images)
+    output_image = generate_image_group(output_images)
 
-        input_image = generate_image_group(input_images)
-        output_image = generate_image_group(output_images)
+    infographic_image = template_image.copy()
+    infographic_image_draw = Draw.Draw(infographic_image)
 
-        infographic_image = template_image.copy()
-        infographic_image_draw = Draw.Draw(infographic_image)
+    image_font = assets.title_font
+    
+    infographic_image_draw.text(xy = (10, 13), text = entry['Title'], font = image_font, fill = 'gray', stroke_width = 1, stroke_fill = 'black')
+    infographic_image_draw.text(xy = (10, 11), text = entry['Title'], font = image_font, fill = 'white', stroke_width = 1, stroke_fill = 'black')
 
-        image_font = Font.truetype('./bin/title.ttf', 26)
-        
-        infographic_image_draw.text(xy = (10, 13), text = entry['Title'], font = image_font, fill = 'gray', stroke_width = 1, stroke_fill = 'black')
-        infographic_image_draw.text(xy = (10, 11), text = entry['Title'], font = image_font, fill = 'white', stroke_width = 1, stroke_fill = 'black')
+    icon = assets.icon(entry['Icon'])
+    icon_position = (int(image_font.getlength(entry['Title'])) + 16, 7)
+    infographic_image.alpha_composite(icon, icon_position)
 
-        icon = Img.open(f'./bin/icons/{entry["Icon"]}.png').convert('RGBA')
-        icon_position = (int(image_font.getlength(entry['Title'])) + 16, 7)
-        infographic_image.alpha_composite(icon, icon_position)
+    if entry['Chooseable']:
+        chooseable_icon = assets.icon('Chooseable')
+        chooseable_icon_x = icon_position[0] + 37
+        infographic_image.alpha_composite(chooseable_icon, (chooseable_icon_x, 5))
 
-        if entry['Chooseable']:
-            chooseable_icon = Img.open(f'./bin/icons/Chooseable.png').convert('RGBA')
-            chooseable_icon_x = icon_position[0] + 37
-            infographic_image.alpha_composite(chooseable_icon, (chooseable_icon_x, 5))
+    infographic_image.alpha_composite(input_image, (15, 54))
+    infographic_image.alpha_composite(output_image, (225, 54))
 
-        infographic_image.alpha_composite(input_image, (15, 54))
-        infographic_image.alpha_composite(output_image, (225, 54))
+    return infographic_image
 
-        infographics.append(infographic_image)
-    
-    if len(infographics) > 1:
-        return combine_images_vertically(infographics, 10)
+# exact palette copy of an RGBA image, None if it has more than 256 colours (quantize() would change pixels to fit)
+def get_palette_image(image: Img.Image) -> Img.Image | None:
+    colors = image.getcolors(256)
+    if colors == None:
+        return None
+
+    palette = b''.join(bytes(color) for _, color in colors)
+    color_indexes = {pixel: index for index, pixel in enumerate(array.array('I', palette))} # each RGBA pixel as one 32 bit int
+
+    palette_image = Img.frombytes('P', image.size, bytes(map(color_indexes.__getitem__, array.array('I', image.tobytes()))))
+    palette_image.putpalette(palette, 'RGBA')
+
+    return palette_image
+
+# writes image to file (a path or file object) in output_format; the defaults come from config
+@instrument.timed('Encode')
+def encode_infographic(image: Img.Image, file, output_format = OUTPUT_FORMAT, compress_level = PNG_COMPRESS_LEVEL, optimize = PNG_OPTIMIZE, quantize = PNG_QUANTIZE) -> None:
+    if output_format == 'webp':
+        if max(image.size) > WEBP_MAX_SIZE:
+            raise ValueError(f'WebP images can\'t be taller than {WEBP_MAX_SIZE} pixels ({image.size[1]} needed), use png for this many quests')
+        image.save(file, 'WEBP', lossless = True)
+
+    elif output_format == 'png':
+        palette_image = get_palette_image(image) if quantize else None
+        (palette_image or image).save(file, 'PNG', compress_level = compress_level, optimize = bool(optimize))
+
+    else:
+        raise ValueError(f'Unknown output format {output_format}, use png or webp')
+
+# encode_infographic to path, adding the format's extension if it's missing; returns the path written
+def save_infographic(image: Img.Image, path: str, output_format = OUTPUT_FORMAT, **options) -> str:
+    extension = OUTPUT_EXTENSIONS.get(output_format, '')
+    if not path.lower().endswith(extension):
+        path += extension
+
+    encode_infographic(image, path, output_format, **options)
+
+    return path
+
+# identifies a quest by everything in its entry, equal entries render to equal panels
+def get_quest_key(entry: dict[str: str | bool]) -> str:
+    return json.dumps(entry, sort_keys = True, ensure_ascii = False)
+
+# mtime and size of a file, None if it's missing
+def get_file_version(path: str) -> tuple[float, int] | None:
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (file_stat.st_mtime, file_stat.st_size)
+
+# everything a quest panel depends on besides its entry, items and frequency icon; read once per RenderPlan
+def get_asset_fingerprint() -> list:
+    return [RENDER_VERSION, UPSCALE, LARGE_SIZE, SMALL_SIZE, BLUEPRINT_SIZE, assets.quantity_font_size, [get_file_version(path) for path in ASSET_FILES]]
+
+# where the finished panel of entry is kept, named by a hash of the entry, the master records and sheet versions of its items
+# (blueprint contents included), its icon and asset_fingerprint; any change gives a new name, so stale panels are never read again
+def get_quest_cache_path(master_dict: dict[str: str | int], entry: dict[str: str | bool], asset_fingerprint: list) -> str:
+    item_names = []
+    for name in entry['Input'] + entry['Output']:
+        item_names.append(name)
+        item_names.extend(master_dict[name]['Contained'])
+
+    items = [(name, master_dict[name], get_sheet_version(master_dict[name]['File'])) for name in item_names]
+    quest = {key: entry[key] for key in ('Input', 'Output', 'Title', 'Icon', 'Chooseable')}
+    key = [asset_fingerprint, get_file_version(f'./bin/icons/{entry["Icon"]}.png'), quest, items]
+
+    return f'./bin/cache/quests/{hashlib.sha1(json.dumps(key, sort_keys = True, ensure_ascii = False).encode()).hexdigest()}.png'
+
+# None if the panel is missing or unreadable (the cache folder can be deleted at any time)
+def load_cached_quest(cache_path: str) -> Img.Image | None:
+    try:
+        with Img.open(cache_path) as cached_image:
+            panel = cached_image.convert('RGBA')
+    except OSError:
+        return None
+
+    _count_cache('Quest Cache Hits')
+    touch_disk_cache(cache_path)
+    return panel
+
+def save_cached_quest(panel: Img.Image, cache_path: str) -> None:
+    with instrument.stage('Save Quest To Disk Cache'):
+        save_to_disk_cache(panel, cache_path, compress_level = 1) # read back far more often than written, size barely matters
+
+# only the part of the master dict that entries use (including blueprint contents), so workers don't each get a full copy
+def get_needed_items(master_dict: dict[str: str | int], entries: list[dict[str: str | bool]]) -> dict[str: str | int]:
+    needed_items = {}
+
+    for entry in entries:
+        for name in entry['Input'] + entry['Output']:
+            needed_items[name] = master_dict[name]
+            for contained_name in master_dict[name]['Contained']:
+                needed_items[contained_name] = master_dict[contained_name]
     
-    return infographics[0]
\ No newline at end of file
+    return needed_items
+
+# state for process pool workers, set once per worker by _init_worker
+_worker_master_dict = None
+_worker_template_image = None
+
+def _init_worker(master_dict: dict[str: str | int], sheet_names: set[str]) -> None:
+    global _worker_master_dict, _worker_template_image
+
+    _worker_master_dict = master_dict
+    _worker_template_image = load_template()
+
+    for sheet_name in sheet_names: # warm the sheet cache before any quest arrives
+        if _get_atlas() == None or sheet_name not in _get_atlas()['Sheets']: # atlas sprites don't need their sheet
+            get_sheet(sheet_name)
+
+def _render_quest_in_worker(entry: dict[str: str | bool]) -> Img.Image:
+    return render_quest(_worker_master_dict, entry, _worker_template_image)
+
+# input should be the master dict and a list of dicts with keys 'Input', 'Output', 'Title', 'Icon', and 'Chooseable'; an empty list is a ValueError
+# parallel renders quests in a process pool (one worker per core), output is identical to the serial path
+# quests are placed into the final canvas one at a time (every panel is the template's size), so peak memory is about the output plus a quest
+# plan (a RenderPlan of entries, pass one to read its counts afterwards) finds the quests already in the quest disk cache; only the others are
+# rendered and then cached. the serial path renders each distinct sprite they need once first, workers rely on their sprite cache
+@instrument.timed('Generate Infographic')
+def generate_infographic(master_dict: dict[str: str | int], entries: list[dict[str: str | bool]], parallel = PARALLEL_RENDER, plan: RenderPlan | None = None) -> Img.Image:
+    if len(entries) == 0: # there'd be nothing but a blank strip to save
+        raise ValueError('No quests to render, add at least one quest')
+
+    template_image = load_template()
+
+    if plan == None:
+        plan = RenderPlan(master_dict, entries)
+
+    uncached_indexes = [index for index in range(len(entries)) if index not in plan.cached_quests]
+    parallel = parallel and len(uncached_indexes) > 1
+
+    if not parallel:
+        plan.render(master_dict)
+
+    def cache_panel(index: int, panel: Img.Image) -> Img.Image:
+        if plan.quest_cache_paths[index] != None: # None while Quest Disk Cache is off, which has nothing to miss
+            _count_cache('Quest Cache Misses')
+            save_cached_quest(panel, plan.quest_cache_paths[index])
+        return panel
+
+    # cached panel, or one rendered and cached again here if it was deleted or is unreadable (without plan, which has no sprites for it)
+    def get_cached_panel(index: int) -> Img.Image:
+        panel = load_cached_quest(plan.quest_cache_paths[index])
+        if panel == None:
+            panel = cache_panel(index, render_quest(master_dict, entries[index], template_image))
+        return panel
+
+    if len(entries) == 1:
+        return get_cached_panel(0) if 0 in plan.cached_quests else cache_panel(0, render_quest(master_dict, entries[0], template_image, plan))
+
+    canvas = create_quest_canvas(template_image.size, len(entries), 10)
+
+    # in entry order, later panels cover the overlap; rendered_panels yields the panels of uncached_indexes in order
+    def place_quests(rendered_panels) -> None:
+        for index in range(len(entries)):
+            if index in plan.cached_quests:
+                panel = get_cached_panel(index)
+            else:
+                panel = cache_panel(index, next(rendered_panels))
+            place_quest(canvas, panel, index, 10)
+
+    if parallel:
+        uncached_entries = [entries[index] for index in uncached_indexes]
+        needed_items = get_needed_items(master_dict, uncached_entries)
+        sheet_names = {item_dict['File'] for item_dict in needed_items.values()}
+        worker_count = min(os.cpu_count() or 1, len(uncached_entries))
+
+        # spawned, not forked: a fork copies _cache_lock as held if the preview thread was decoding a sheet, and the workers would wait on it forever
+        with concurrent.futures.ProcessPoolExecutor(max_workers = worker_count, mp_context = multiprocessing.get_context('spawn'), initializer = _init_worker, initargs = (needed_items, sheet_names)) as executor:
+            place_quests(executor.map(_render_quest_in_worker, uncached_entries)) # in order, as they finish
+
+    else:
+        place_quests(render_quest(master_dict, entries[index], template_image, plan) for index in uncached_indexes)
+
+    return canvas
@@ -0,0 +1,106 @@
+import bisect, collections
+
+# case-insensitive prefix and typo-tolerant lookups over item names, built once from the master dict
+# prefixes use a sorted list + bisect, typos use a trigram index (names sharing the most 3 letter chunks with the query)
+class ItemIndex:
+    def __init__(self, names):
+        pairs = sorted((name.lower(), name) for name in names)
+
+        self._lowered = [lowered for lowered, _ in pairs]
+        self._names = [name for _, name in pairs]
+        self._name_set = set(self._names)
+        self._by_lowered = {}
+        self._trigrams = collections.defaultdict(list) # trigram -> positions in self._names
+        self._trigram_counts = []
+
+        for position, lowered in enumerate(self._lowered):
+            self._by_lowered.setdefault(lowered, self._names[position])
+            trigrams = set(_get_trigrams(lowered))
+            self._trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                self._trigrams[trigram].append(position)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._name_set
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    # names starting with query, ignoring case
+    def prefix(self, query: str, limit: int = 10) -> list[str]:
+        query = query.lower()
+        matches = []
+
+        position = bisect.bisect_left(self._lowered, query)
+        while position < len(self._lowered) and len(matches) < limit and self._lowered[position].startswith(query):
+            matches.append(self._names[position])
+            position += 1
+
+        return matches
+
+    # names most similar to query, for typos
+    def fuzzy(self, query: str, limit: int = 10) -> list[str]:
+        query_trigrams = set(_get_trigrams(query.lower()))
+        postings = sorted((self._trigrams[trigram] for trigram in query_trigrams if trigram in self._trigrams), key = len)
+        if postings == []:
+            return []
+
+        # candidates are the names hit by the most of the rarest trigrams, common ones like ' po' match thousands of names
+        hits = collections.Counter()
+        counted = 0
+        for posting in postings:
+            if counted + len(posting) > 1500 and counted:
+                break
+            hits.update(posting)
+            counted += len(posting)
+        candidates = [position for position, _ in hits.most_common(60)]
+
+        scored = []
+        for position in candidates:
+            padded_name = f'  {self._lowered[position]} '
+            shared = sum(1 for trigram in query_trigrams if trigram in padded_name) # substring checks are cheaper than building the name's trigrams
+            scored.append((shared / (len(query_trigrams) + self._trigram_counts[position] - shared), self._names[position])) # jaccard similarity
+
+        scored.sort(key = lambda score_name: (-score_name[0], score_name[1]))
+
+        return [name for _, name in scored[:limit]]
+
+    # prefix matches first, topped up with fuzzy matches
+    def suggest(self, query: str, limit: int = 10) -> list[str]:
+        if query.strip() == '':
+            return []
+
+        suggestions = self.prefix(query, limit)
+        if len(suggestions) >= limit:
+            return suggestions
+
+        for name in self.fuzzy(query, limit):
+            if len(suggestions) >= limit:
+                break
+            if name not in suggestions:
+                suggestions.append(name)
+
+        return suggestions
+
+    # best guess for a name that isn't in the index (same name with different case first)
+    def closest(self, query: str) -> str | None:
+        if query.lower() in self._by_lowered:
+            return self._by_lowered[query.lower()]
+
+        matches = self.fuzzy(query, 1)
+        return matches[0] if matches else None
+
+    # names in entries (same shape as app.get_quest_info) that aren't items, mapped to a suggestion or None
+    def find_unknown(self, entries: list[dict[str: str | bool]]) -> dict[str: str | None]:
+        unknown = {}
+
+        for entry in entries:
+            for name in entry['Input'] + entry['Output']:
+                if name not in self and name not in unknown:
+                    unknown[name] = self.closest(name) if name != '' else None
+
+        return unknown
+
+def _get_trigrams(text: str) -> list[str]:
+    padded = f'  {text} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
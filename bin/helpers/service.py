@@ -0,0 +1,237 @@
+import collections, concurrent.futures, http.server, io, json, os, threading, time
+import bin.helpers.load as load
+import bin.helpers.render as render
+
+MAX_REQUEST_BYTES = 2 ** 20 # quest specs are small, anything bigger is a mistake
+CHANGE_CHECK_INTERVAL = 1.0 # seconds between a worker's checks for a new master.json, atlas or assets
+LATENCY_SAMPLES = 1000 # recent renders kept for the percentiles in /health
+
+# files an update rewrites; when one of them changes a worker loads the master again and drops its render caches
+WATCHED_FILES = ['./bin/json/master.json', './bin/json/master-db.json', './bin/atlas/atlas.json', './bin/template.png', './bin/title.ttf', './bin/quantity.ttf']
+
+# state of each worker process, set by _init_worker and kept warm between requests
+_worker_master_dict = None
+_worker_versions = None
+_worker_generation = 0
+_worker_last_check = 0
+_worker_reloads = 0
+
+def _get_watched_versions() -> dict[str: float | None]:
+    return {path: os.path.getmtime(path) if os.path.exists(path) else None for path in WATCHED_FILES}
+
+def _init_worker() -> None:
+    global _worker_master_dict, _worker_versions
+
+    _worker_versions = _get_watched_versions()
+    _worker_master_dict = load.get_master_dict()
+
+    # loaded now instead of during the first request
+    render.load_template()
+    render.assets.title_font
+
+# load.setup (from the app or another process) replaces files in place, so they're checked by mtime now and then
+# generation is bumped by RenderService.reload to make every worker reload on its next request
+def _reload_worker_if_changed(generation: int) -> None:
+    global _worker_master_dict, _worker_versions, _worker_generation, _worker_last_check, _worker_reloads
+
+    if generation == _worker_generation and time.perf_counter() - _worker_last_check < CHANGE_CHECK_INTERVAL:
+        return
+    _worker_last_check = time.perf_counter()
+
+    watched_versions = _get_watched_versions()
+    if generation == _worker_generation and watched_versions == _worker_versions:
+        return
+
+    load.close_master_dict(_worker_master_dict) # only this worker's requests use it, one at a time
+    _worker_master_dict = load.get_master_dict()
+    _worker_versions = watched_versions
+    _worker_generation = generation
+    _worker_reloads += 1
+    render.clear_caches()
+
+# returns the encoded image and the worker's stats (merged into /health by the service)
+def _render_in_worker(entries: list[dict[str: str | bool]], output_format: str, generation: int) -> tuple[bytes, int, dict]:
+    _reload_worker_if_changed(generation)
+
+    output = io.BytesIO()
+    render.encode_infographic(render.generate_infographic(_worker_master_dict, entries, parallel = False), output, output_format)
+
+    return output.getvalue(), os.getpid(), {**render.cache_stats, 'Reloads': _worker_reloads, 'Items': len(_worker_master_dict)}
+
+# renders on a pool of worker processes, each keeping its master, render assets and caches warm between requests
+class RenderService:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = _init_worker)
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._generation = 0
+        self._requests = 0
+        self._errors = 0
+        self._latencies = collections.deque(maxlen = LATENCY_SAMPLES)
+        self._worker_stats = {} # pid -> latest stats of that worker
+
+        concurrent.futures.wait([self._executor.submit(time.sleep, 0.1) for _ in range(workers)]) # starts the workers (and loads their master) before the first request
+
+    # workers load the master and assets again on their next request
+    def reload(self) -> None:
+        with self._lock:
+            self._generation += 1
+
+    # blocks until a worker has rendered and encoded entries, returns the encoded bytes
+    def render(self, entries: list[dict[str: str | bool]], output_format: str) -> bytes:
+        start = time.perf_counter()
+
+        try:
+            image_bytes, pid, worker_stats = self._executor.submit(_render_in_worker, entries, output_format, self._generation).result()
+        except Exception:
+            self.count_request(None)
+            raise
+
+        self.count_request(time.perf_counter() - start)
+        with self._lock:
+            self._worker_stats[pid] = worker_stats
+
+        return image_bytes
+
+    # seconds is None for failed requests
+    def count_request(self, seconds: float | None) -> None:
+        with self._lock:
+            self._requests += 1
+            if seconds == None:
+                self._errors += 1
+            else:
+                self._latencies.append(seconds)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            cache_stats = collections.Counter()
+            for worker_stats in self._worker_stats.values():
+                cache_stats.update({name: count for name, count in worker_stats.items() if name not in ('Reloads', 'Items')})
+
+            stats = {
+                'Uptime Seconds': time.time() - self._started,
+                'Workers': self.workers,
+                'Items': max((worker_stats['Items'] for worker_stats in self._worker_stats.values()), default = None),
+                'Requests': self._requests,
+                'Errors': self._errors,
+                'Worker Reloads': sum(worker_stats['Reloads'] for worker_stats in self._worker_stats.values()),
+                'Latency Seconds': {f'p{percentile}': latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)] if latencies else None for percentile in (50, 90, 99)},
+                'Cache': dict(cache_stats)
+            }
+
+        for cache in ('Sheet', 'Sprite', 'Quest'):
+            hits = cache_stats[f'{cache} Cache Hits']
+            lookups = hits + cache_stats[f'{cache} Cache Misses'] + cache_stats[f'{cache} Disk Cache Hits']
+            stats['Cache'][f'{cache} Hit Rate'] = hits / lookups if lookups else None
+
+        return stats
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+# POST /render with a json list of quests (same shape as app.get_quest_info, or one quest) -> image bytes, ?format=webp for webp
+# GET /health -> json stats, POST /reload -> workers load the master and assets again
+class RenderRequestHandler(http.server.BaseHTTPRequestHandler):
+    service = None # set by serve
+
+    def do_GET(self) -> None:
+        if self.path == '/health':
+            self._send_json(200, self.service.get_stats())
+        else:
+            self._send_json(404, {'Error': f'Unknown path {self.path}'})
+
+    def do_POST(self) -> None:
+        path, _, query = self.path.partition('?')
+
+        if path == '/reload':
+            self.service.reload()
+            self._send_json(200, {'Reloaded': True})
+            return
+
+        if path != '/render':
+            self._send_json(404, {'Error': f'Unknown path {path}'})
+            return
+
+        if 'Content-Length' not in self.headers: # the body is read by length, there's no other way to tell where it ends
+            self._send_json(411, {'Error': 'Content-Length is required'})
+            return
+
+        body_length = self.headers['Content-Length']
+        if not body_length.isdigit(): # int() would also take '-1' (read until the client closes) and raise on anything else
+            self._send_json(400, {'Error': f'Invalid Content-Length {body_length}'})
+            return
+
+        body_length = int(body_length)
+        if body_length > MAX_REQUEST_BYTES:
+            self._send_json(413, {'Error': f'Request is over {MAX_REQUEST_BYTES} bytes'})
+            return
+
+        output_format = dict(parameter.partition('=')[::2] for parameter in query.split('&') if parameter).get('format', render.OUTPUT_FORMAT)
+        if output_format not in render.OUTPUT_EXTENSIONS:
+            self._send_json(400, {'Error': f'Unknown format {output_format}, use png or webp'})
+            return
+
+        try:
+            entries = json.loads(self.rfile.read(body_length))
+            if isinstance(entries, dict): # a single quest is allowed too
+                entries = [entries]
+            if not isinstance(entries, list) or entries == []:
+                raise ValueError('expected a list of quests')
+
+        except ValueError as exception:
+            self.service.count_request(None)
+            self._send_json(400, {'Error': f'Invalid quest json: {exception}'})
+            return
+
+        try:
+            image_bytes = self.service.render(entries, output_format)
+
+        except KeyError as key:
+            self._send_json(400, {'Error': f'Missing item or key {key}'})
+            return
+
+        except Exception as exception:
+            self._send_json(500, {'Error': f'Unexpected error while rendering: {exception}'})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', f'image/{output_format}')
+        self.send_header('Content-Length', str(len(image_bytes)))
+        self.end_headers()
+        self.wfile.write(image_bytes)
+
+    def _send_json(self, status: int, content: dict) -> None:
+        body = json.dumps(content, indent = 4, ensure_ascii = False).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None: # quiet, /health would fill the terminal
+        pass
+
+# starts the workers and binds the server without serving yet (port 0 picks a free port, see server.server_address)
+def create_server(host: str, port: int, workers: int) -> http.server.ThreadingHTTPServer:
+    if not os.path.exists('./bin/json/master.json'):
+        raise FileNotFoundError('./bin/json/master.json is missing, open the app once or run an update first')
+
+    render.prune_disk_caches() # renders left behind by earlier updates
+    RenderRequestHandler.service = RenderService(workers)
+    return http.server.ThreadingHTTPServer((host, port), RenderRequestHandler)
+
+# runs until interrupted (Ctrl+C); only listens on localhost unless host says otherwise
+def serve(host: str = '127.0.0.1', port: int = 8765, workers: int = os.cpu_count() or 1) -> None:
+    server = create_server(host, port, workers)
+    print(f'Rendering on http://{host}:{server.server_address[1]} with {workers} workers (POST /render, GET /health, POST /reload)')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        RenderRequestHandler.service.close()
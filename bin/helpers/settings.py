@@ -0,0 +1,18 @@
+import json
+
+CONFIG_PATH = './bin/config.json'
+
+# reads config.json from disk, for the few things that pick up changes without restarting
+def read_config() -> dict[str: str | int]:
+    with open(CONFIG_PATH, 'r') as f:
+        return json.load(f)
+
+# loaded once per process and shared by every module (load.get_config returns this same dict)
+config = read_config()
+
+# changes 1 key in memory and in config.json
+def update_config(key: str, value: str | int) -> None:
+    config[key] = value
+
+    with open(CONFIG_PATH, 'w') as f:
+        json.dump(config, f, indent = 4, ensure_ascii = False)
@@ -1,11 +1,12 @@
 import tkinter as tk
 import tkinter.font as tkfont
 import tkinter.ttk as ttk
-import json
+import PIL.Image as Img
+import queue, threading
+import bin.helpers.settings as settings
 
-with open('./bin/config.json', 'r') as f:
-    config = json.load(f)
-    style_config = config['Style']
+config = settings.config
+style_config = config['Style']
 
 auto_update = config['Auto Update']
 
@@ -19,40 +20,161 @@ BG = style_config['bg']
 #BORDERWIDTH = style_config['borderwidth']
 FONTSIZE = style_config['fontsize']
 
-class TextWithVariable(tk.Text):
-    def __init__(self, *args, variable: tk.StringVar, **kwargs):
+ROW_PADDING = 15 # around each quest row
+
+# one quest of the editor; only the quests scrolled into view have a QuestRow showing them, which writes edits back here
+# frequency defaults to the first real option, not sure why, but had to include a blank value for index 0
+class Quest:
+    def __init__(self, title: str = '', frequency: str = FREQUENCY_OPTIONS[1], chooseable: int = 0, input: str = '', output: str = ''):
+        self.title = title
+        self.frequency = frequency
+        self.chooseable = chooseable
+        self.input = input # item names, one per line
+        self.output = output
+
+# with an item_index, lines that aren't item names are shown in red and the current line gets a list of suggestions (Tab or click to accept)
+# on_edit is called after the text changes; the text itself is only read when it's needed (see QuestRow.save)
+class ItemText(tk.Text):
+    def __init__(self, *args, on_edit = None, item_index = None, **kwargs):
         tk.Text.__init__(self, *args, **kwargs)
 
-        self._variable = variable
+        self._on_edit = on_edit
+        self._item_index = item_index
+        self._suggestions_window = None
+
+        self.tag_configure('unknown', foreground = 'red')
 
         self.bind('<KeyRelease>', self._update)
+        self.bind('<Tab>', self._accept_suggestion)
+        self.bind('<Escape>', lambda _: self._hide_suggestions())
+        self.bind('<FocusOut>', lambda _: self.after(150, self._hide_suggestions)) # delayed so clicking a suggestion still registers
+
+    def set_item_index(self, item_index) -> None:
+        self._item_index = item_index
+        self._hide_suggestions()
+        if self._item_index != None:
+            self._mark_unknown()
+
+    def get_text(self) -> str:
+        return self.get('1.0', tk.END + '-1c')
+
+    # replaces the text without it counting as an edit
+    def set_text(self, text: str) -> None:
+        self.delete('1.0', tk.END)
+        self.insert('1.0', text)
+        self.edit_modified(False)
+
+        self._hide_suggestions()
+        if self._item_index != None:
+            self._mark_unknown()
+
+    def _update(self, event) -> None:
+        if self.edit_modified(): # set by tk on any change, so moving the cursor isn't reported
+            self.edit_modified(False)
+            self._notify_edit()
+
+        if self._item_index == None:
+            return
+
+        self._mark_unknown()
+        if event.keysym not in ('Tab', 'Escape', 'Up', 'Down', 'Left', 'Right'):
+            self._show_suggestions()
+
+    def _get_line_name(self, start: str, end: str) -> str:
+        return self.get(start, end).strip().replace("’", "'") # same cleanup as app.get_quest_info
+
+    def _mark_unknown(self) -> None:
+        self.tag_remove('unknown', '1.0', tk.END)
+
+        line_count = int(self.index('end-1c').split('.')[0])
+        for line in range(1, line_count + 1):
+            name = self._get_line_name(f'{line}.0', f'{line}.end')
+            if name != '' and name not in self._item_index:
+                self.tag_add('unknown', f'{line}.0', f'{line}.end')
+
+    def _show_suggestions(self) -> None:
+        name = self._get_line_name('insert linestart', 'insert lineend')
+        suggestions = [] if name in self._item_index else self._item_index.suggest(name, 8)
+        cursor_box = self.bbox('insert')
+
+        if suggestions == [] or cursor_box == None:
+            self._hide_suggestions()
+            return
+
+        if self._suggestions_window == None:
+            self._suggestions_window = tk.Toplevel(self)
+            self._suggestions_window.overrideredirect(True)
+            self._suggestions_listbox = tk.Listbox(self._suggestions_window, font = self.cget('font'), height = 8, activestyle = tk.NONE)
+            self._suggestions_listbox.bind('<ButtonRelease-1>', self._accept_suggestion)
+            self._suggestions_listbox.pack(fill = tk.BOTH, expand = True)
+
+        self._suggestions_listbox.delete(0, tk.END)
+        self._suggestions_listbox.insert(tk.END, *suggestions)
+        self._suggestions_listbox.config(height = len(suggestions), width = max(len(suggestion) for suggestion in suggestions))
+        self._suggestions_listbox.selection_set(0)
+
+        x = self.winfo_rootx() + cursor_box[0]
+        y = self.winfo_rooty() + cursor_box[1] + cursor_box[3]
+        self._suggestions_window.geometry(f'+{x}+{y}')
+        self._suggestions_window.deiconify()
+        self._suggestions_window.lift()
+
+    def _hide_suggestions(self) -> None:
+        if self._suggestions_window != None and self._suggestions_window.winfo_exists():
+            self._suggestions_window.withdraw()
+
+    # replaces the current line with the selected (or first) suggestion; returns 'break' so tab isn't typed
+    def _accept_suggestion(self, _) -> str | None:
+        if self._suggestions_window == None or self._suggestions_window.state() == 'withdrawn':
+            return None # nothing to accept, tab works normally
+        
+        selection = self._suggestions_listbox.curselection()
+        name = self._suggestions_listbox.get(selection[0] if selection else 0)
+
+        self.delete('insert linestart', 'insert lineend')
+        self.insert('insert linestart', name)
+        self._hide_suggestions()
+        self.focus_set()
+
+        self.edit_modified(False)
+        self._notify_edit()
+        self._mark_unknown()
+
+        return 'break'
 
-    def _update(self, _) -> None:
-        self._variable.set(self.get('1.0', tk.END + '-1c'))
+    def _notify_edit(self) -> None:
+        if self._on_edit != None:
+            self._on_edit()
 
-class QuestObject(ttk.Frame):
-    def __init__(self, *args, index: int, **kwargs):
+# the widgets of one quest, reused for whichever quest is scrolled into its place (see App._update_rows)
+# arrow is shared by every row; on_change is called whenever the shown quest is edited, on_delete(index) by its × button
+class QuestRow(ttk.Frame):
+    def __init__(self, *args, arrow: tk.PhotoImage, item_index = None, on_change = None, on_delete = None, **kwargs):
         ttk.Frame.__init__(self, *args, **kwargs)
 
-        self.index = index
+        self.quest = None
+        self.index = None # of quest in App's list
+        self._on_change = on_change
+        self._showing = False # set while show() fills the widgets, which isn't an edit
+        self._text_edited = False
+
+        self._title = tk.StringVar(self, value = '')
+        self._frequency = tk.StringVar(self, value = FREQUENCY_OPTIONS[1])
+        self._chooseable = tk.IntVar(self, value = 0)
 
-        self.title = tk.StringVar(self, value = '')
-        self.frequency = tk.StringVar(self, value = FREQUENCY_OPTIONS[1]) # not sure why, but had to include a blank value for index 0
-        self.chooseable = tk.IntVar(self, value = 0)
-        self.input = tk.StringVar(self)
-        self.output = tk.StringVar(self)
+        for variable, attribute in ((self._title, 'title'), (self._frequency, 'frequency'), (self._chooseable, 'chooseable')):
+            variable.trace_add('write', lambda *_, variable = variable, attribute = attribute: self._edited(attribute, variable.get()))
 
         self._font = tkfont.nametofont('TkDefaultFont')
-        self._font.configure(size = FONTSIZE)
 
         self._options_frame = ttk.Frame(self)
 
         self._title_label = ttk.Label(self._options_frame, text = 'Title: ')
-        self._title_entry = ttk.Entry(self._options_frame, textvariable = self.title)
-        self._frequency_optionmenu = ttk.OptionMenu(self._options_frame, self.frequency, *FREQUENCY_OPTIONS)
-        self._chooseable_check = ttk.Checkbutton(self._options_frame, text = 'Chooseable', variable = self.chooseable)
+        self._title_entry = ttk.Entry(self._options_frame, textvariable = self._title)
+        self._frequency_optionmenu = ttk.OptionMenu(self._options_frame, self._frequency, *FREQUENCY_OPTIONS)
+        self._chooseable_check = ttk.Checkbutton(self._options_frame, text = 'Chooseable', variable = self._chooseable)
         self._options_spacer_frame = ttk.Frame(self._options_frame, width = 125)
-        self._delete_button = ttk.Button(self._options_frame, text = '×', width = 3, command = self.destroy)
+        self._delete_button = ttk.Button(self._options_frame, text = '×', width = 3, command = lambda: on_delete(self.index))
 
         self._title_label.grid(row = 0, column = 0, padx = 5)
         self._title_entry.grid(row = 0, column = 1, padx = 5)
@@ -65,10 +187,9 @@ class QuestObject(ttk.Frame):
 
         self._io_frame = ttk.Frame(self)
 
-        self._input_text = TextWithVariable(self._io_frame, font = self._font, variable = self.input, width = 37, height = 8)
-        self._arrow = tk.PhotoImage(file = './bin/icons/Arrow.png', format = 'PNG')
-        self._arrow_label = ttk.Label(self._io_frame, image = self._arrow)
-        self._output_text = TextWithVariable(self._io_frame, font = self._font, variable = self.output, width = 37, height = 8)
+        self._input_text = ItemText(self._io_frame, font = self._font, on_edit = self._text_changed, item_index = item_index, width = 37, height = 8)
+        self._arrow_label = ttk.Label(self._io_frame, image = arrow)
+        self._output_text = ItemText(self._io_frame, font = self._font, on_edit = self._text_changed, item_index = item_index, width = 37, height = 8)
 
         self._input_text.grid(row = 0, column = 0)
         self._arrow_label.grid(row = 0, column = 1)
@@ -76,22 +197,75 @@ class QuestObject(ttk.Frame):
 
         self._io_frame.grid(row = 1, column = 0, sticky = tk.W)
 
-        self.grid(row = self.index, column = 0, padx = 15, pady = 15)
+    # fills the widgets with quest (saving the previous one first); index is only updated if it's the same quest
+    def show(self, quest: Quest, index: int) -> None:
+        self.index = index
+        if quest is self.quest:
+            return
+
+        self.save()
+        try:
+            if str(self.focus_get()).startswith(f'{self}.'): # the cursor would otherwise keep typing into a different quest
+                self.master.focus_set()
+        except KeyError: # focus_get fails while a menu has the focus
+            pass
+
+        self.quest = quest
+        self._showing = True
+        self._title.set(quest.title)
+        self._frequency.set(quest.frequency)
+        self._chooseable.set(quest.chooseable)
+        self._input_text.set_text(quest.input)
+        self._output_text.set_text(quest.output)
+        self._showing = False
+
+    # writes the text boxes back into the quest if they were edited since
+    def save(self) -> None:
+        if self.quest != None and self._text_edited:
+            self.quest.input = self._input_text.get_text()
+            self.quest.output = self._output_text.get_text()
+        self._text_edited = False
+
+    def set_item_index(self, item_index) -> None:
+        self._input_text.set_item_index(item_index)
+        self._output_text.set_item_index(item_index)
+
+    def _edited(self, attribute: str, value: str | int) -> None:
+        if self._showing or self.quest == None:
+            return
+
+        setattr(self.quest, attribute, value)
+        self._notify_change()
+
+    def _text_changed(self) -> None:
+        self._text_edited = True
+        self._notify_change()
+
+    def _notify_change(self) -> None:
+        if self._on_change != None:
+            self._on_change()
 
 # must call mainloop (done so you can bind things to it outside of this module)
+# item_index (search.ItemIndex) turns on name checking and suggestions in the quest text boxes
+# on_change is called (with no arguments) when quests are added, removed or edited
+# quests are kept as Quest objects and only the rows on screen have widgets (QuestRow), so hundreds of quests stay fast
 class App:
-    def __init__(self):
-        self._quest_objects = []
+    def __init__(self, item_index = None):
+        self._quests = []
+        self._rows = []
+        self._row_windows = {} # QuestRow -> its canvas window item
+        self._row_height = None # measured from the first row
+        self.item_index = item_index
+        self.on_change = None
 
         self.root = tk.Tk()
         self.root.title('Quest Infographic Maker')
-        self.root.geometry('1000x500')
+        self.root.geometry('1400x600')
         #icon
         
         self._style = ttk.Style()
 
         self._style.configure('.', focuscolor = BG)
-        self._style.configure('Block.TFrame', borderwidth = 1, relief = 'solid')
 
         self._font = tkfont.nametofont('TkDefaultFont')
         self._font.configure(size = FONTSIZE)
@@ -102,26 +276,37 @@ class App:
 
         self._canvas_frame = ttk.Frame(self._main_frame)
 
-        self._canvas = tk.Canvas(self._canvas_frame, bg = BG, width = 600,height = 50, scrollregion = (0, 0, 0, 50))
+        self._arrow = tk.PhotoImage(file = './bin/icons/Arrow.png', format = 'PNG') # shared by every row
+
+        self.quest_canvas = tk.Canvas(self._canvas_frame, bg = BG, width = 600,height = 50, scrollregion = (0, 0, 0, 50))
         self._scrollbar = ttk.Scrollbar(self._canvas_frame, orient = tk.VERTICAL)
-        self._scrollbar.config(command = self._canvas.yview)
-        self._canvas.config(yscrollcommand = self._scrollbar.set)
+        self._scrollbar.config(command = self.quest_canvas.yview)
+        self.quest_canvas.config(yscrollcommand = self._scrolled)
 
         self._scrollbar.place(relx = 1, rely = 0, width = 15, relheight = 1, anchor = tk.NE)
-        self._canvas.place(relx = 0, rely = 0, relwidth = 1, relheight = 1)
+        self.quest_canvas.place(relx = 0, rely = 0, relwidth = 1, relheight = 1)
 
-        self._canvas_contained_frame = ttk.Frame(self._canvas, style = 'Block.TFrame')
-        self._canvas_contained_frame.bind("<Configure>", lambda _: self._canvas.configure(scrollregion = self._canvas.bbox('all')))
-        self._canvas.bind_all("<MouseWheel>", lambda event: self._canvas.yview_scroll(int(-1 * (event.delta / 120)), 'units'))
+        self.quest_canvas.bind('<Configure>', lambda _: self._update_rows()) # more rows may fit now
+        self.quest_canvas.bind_all("<MouseWheel>", lambda event: self.quest_canvas.yview_scroll(int(-1 * (event.delta / 120)), 'units'))
 
-        self._add_quest_frame = ttk.Frame(self._canvas_contained_frame)
-        self._add_quest_button = ttk.Button(self._add_quest_frame, text = '+', width = 3, command = self._add_graphic)
+        self._add_quest_frame = ttk.Frame(self.quest_canvas)
+        self._add_quest_button = ttk.Button(self._add_quest_frame, text = '+', width = 3, command = self.add_quest)
         self._add_quest_label = ttk.Label(self._add_quest_frame, text = 'Add a Quest')
         self._add_quest_button.grid(row = 0, column = 0)
         self._add_quest_label.grid(row = 0, column = 1, padx = 5)
-        self._add_quest_frame.grid(row = 0, column = 1, padx = 10, pady = 5)
 
-        self._canvas.create_window((0, 0), anchor = tk.NW, window = self._canvas_contained_frame, state = tk.NORMAL)
+        self._add_quest_window = self.quest_canvas.create_window((10, 5), anchor = tk.NW, window = self._add_quest_frame) # moved next to the first row once there is one
+
+        self._preview_frame = ttk.Frame(self._main_frame)
+
+        self.preview_canvas = tk.Canvas(self._preview_frame, bg = BG, width = 400, highlightthickness = 0) # template width, so previews are shown 1:1
+        self._preview_scrollbar = ttk.Scrollbar(self._preview_frame, orient = tk.VERTICAL, command = self.preview_canvas.yview)
+        self.preview_canvas.config(yscrollcommand = self._preview_scrollbar.set)
+
+        self._preview_scrollbar.pack(side = tk.RIGHT, fill = tk.Y)
+        self.preview_canvas.pack(side = tk.LEFT, fill = tk.BOTH, expand = True)
+
+        self._preview_frame.pack(side = tk.RIGHT, fill = tk.Y, padx = (0, 10), pady = 10)
 
         self._canvas_frame.pack(side = tk.TOP, fill = tk.BOTH, expand = True)
 
@@ -140,33 +325,203 @@ class App:
         self.preview_button.grid(row = 0, column = 1)
         self.settings_menubutton.grid(row = 0, column = 2)
 
+        # update progress, only gridded while an update runs
+        self._update_progressbar = ttk.Progressbar(self._buttons_frame, length = 200, mode = 'determinate', maximum = 1)
+        self._update_label = ttk.Label(self._buttons_frame)
+        self.cancel_update_button = ttk.Button(self._buttons_frame, text = 'Cancel Update')
+
         self._buttons_frame.pack(side = tk.BOTTOM, fill = tk.X, padx = 10, pady = 10)
 
         self._main_frame.pack(fill = tk.BOTH, expand = True)
     
-    def _add_graphic(self) -> None:
-        quest_object = QuestObject(self._canvas_contained_frame, index = len(self._quest_objects))
-        quest_object.bind('<Destroy>', lambda _: self._update_graphic_indexes())
-        self._quest_objects.append(quest_object)
-
-    def _update_graphic_indexes(self) -> None:
-        self._quest_objects = [quest_object for quest_object in self._quest_objects if quest_object.winfo_exists()] # filters non-existing objects
-
-        for index, quest_object in enumerate(self._quest_objects):
-            quest_object.index = index
-            quest_object.grid(row = index, column = 0, padx = 15, pady = 15)
+    # appends quest (a new empty one by default) and returns it
+    def add_quest(self, quest: Quest | None = None) -> Quest:
+        if quest == None:
+            quest = Quest()
+
+        self._quests.append(quest)
+        self._update_scrollregion()
+        self._update_rows()
+        self._notify_change()
+
+        return quest
+
+    # quests below move up by one; only the rows on screen are touched, however many quests there are
+    def delete_quest(self, index: int) -> None:
+        del self._quests[index]
+        self._update_scrollregion()
+        self._update_rows()
+        self._notify_change()
+
+    def _create_row(self) -> QuestRow:
+        row = QuestRow(self.quest_canvas, arrow = self._arrow, item_index = self.item_index, on_change = self._notify_change, on_delete = self.delete_quest)
+        self._row_windows[row] = self.quest_canvas.create_window((ROW_PADDING, 0), anchor = tk.NW, window = row, state = tk.HIDDEN)
+        self._rows.append(row)
+
+        if self._row_height == None: # every row has the same widgets, so the first one gives the size of all of them
+            row.update_idletasks()
+            self._row_height = row.winfo_reqheight() + 2 * ROW_PADDING
+            self.quest_canvas.coords(self._add_quest_window, row.winfo_reqwidth() + 2 * ROW_PADDING + 10, 5)
+            self._update_scrollregion()
+
+        return row
+
+    def _update_scrollregion(self) -> None:
+        self.quest_canvas.config(scrollregion = (0, 0, 0, max(50, len(self._quests) * (self._row_height or 0))))
+
+    def _scrolled(self, first: str, last: str) -> None:
+        self._scrollbar.set(first, last)
+        self._update_rows()
+
+    # shows the quests in view (plus a partly visible one at each end) on the pooled rows; a row keeps its quest while it stays in view
+    def _update_rows(self) -> None:
+        if self._row_height == None:
+            if self._quests == []:
+                return
+            self._create_row()
+
+        first_index = max(0, int(self.quest_canvas.canvasy(0) // self._row_height))
+        row_count = self.quest_canvas.winfo_height() // self._row_height + 2
+        visible_quests = self._quests[first_index:first_index + row_count]
+
+        while len(self._rows) < len(visible_quests):
+            self._create_row()
+
+        visible_ids = {id(quest) for quest in visible_quests}
+        kept_rows = {id(row.quest): row for row in self._rows if id(row.quest) in visible_ids}
+        free_rows = [row for row in self._rows if id(row.quest) not in visible_ids]
+
+        for offset, quest in enumerate(visible_quests):
+            row = kept_rows[id(quest)] if id(quest) in kept_rows else free_rows.pop()
+            row.show(quest, first_index + offset)
+            self.quest_canvas.coords(self._row_windows[row], ROW_PADDING, (first_index + offset) * self._row_height + ROW_PADDING)
+            self.quest_canvas.itemconfigure(self._row_windows[row], state = tk.NORMAL)
+
+        for row in free_rows:
+            row.save()
+            self.quest_canvas.itemconfigure(self._row_windows[row], state = tk.HIDDEN)
+
+    # fraction None shows the bar as busy instead of filling it
+    def show_update_progress(self, text: str, fraction: float | None) -> None:
+        if not self._update_progressbar.winfo_ismapped():
+            self._update_progressbar.grid(row = 0, column = 3, padx = (20, 5))
+            self._update_label.grid(row = 0, column = 4, padx = 5)
+            self.cancel_update_button.grid(row = 0, column = 5)
+
+        if fraction == None:
+            if str(self._update_progressbar.cget('mode')) != 'indeterminate':
+                self._update_progressbar.config(mode = 'indeterminate')
+                self._update_progressbar.start(15)
+        else:
+            self._update_progressbar.stop()
+            self._update_progressbar.config(mode = 'determinate', value = fraction)
+
+        self._update_label.config(text = text)
+
+    def hide_update_progress(self) -> None:
+        self._update_progressbar.stop()
+        self._update_progressbar.grid_remove()
+        self._update_label.grid_remove()
+        self.cancel_update_button.grid_remove()
+
+    # swaps the index the quest text boxes check names against (after an update)
+    def set_item_index(self, item_index) -> None:
+        self.item_index = item_index
+        for row in self._rows:
+            row.set_item_index(item_index)
+
+    def _notify_change(self) -> None:
+        if self.on_change != None:
+            self.on_change()
     
+    # the text of a quest is read from its row here, and only if it was edited since the last read
     def get_quest_info(self) -> dict[str: str | int]:
         quest_dicts = []
 
-        for quest_object in self._quest_objects:
+        for row in self._rows:
+            row.save()
+
+        for quest in self._quests:
             quest_dict = {
-                'Input': [item_name.strip().replace("’", "'") for item_name in quest_object.input.get().split('\n')],
-                'Output': [item_name.strip().replace("’", "'") for item_name in quest_object.output.get().split('\n')],
-                'Title': quest_object.title.get(),
-                'Icon': quest_object.frequency.get().strip(),
-                'Chooseable': quest_object.chooseable.get()
+                'Input': [item_name.strip().replace("’", "'") for item_name in quest.input.split('\n')],
+                'Output': [item_name.strip().replace("’", "'") for item_name in quest.output.split('\n')],
+                'Title': quest.title,
+                'Icon': quest.frequency.strip(),
+                'Chooseable': quest.chooseable
             }
             quest_dicts.append(quest_dict)
         
-        return quest_dicts
\ No newline at end of file
+        return quest_dicts
+
+# renders previews on a worker thread so the window never freezes; request() is debounced, so a burst of edits becomes one render
+# render_function(entries, is_stale) returns an image or a message to show, and should give up (return None) once is_stale() is true
+class LivePreview:
+    def __init__(self, root: tk.Tk, canvas: tk.Canvas, get_entries, render_function, delay: int = 400):
+        self._root = root
+        self._canvas = canvas
+        self._get_entries = get_entries
+        self._render_function = render_function
+        self._delay = delay # ms after the last edit
+
+        self._after_id = None
+        self._generation = 0 # bumped for every render request, results of older requests are thrown away
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._photo = None # kept so tk doesn't lose the image
+
+        threading.Thread(target = self._work, daemon = True).start()
+        self._poll()
+
+    def request(self, delay: int | None = None) -> None:
+        if self._after_id != None:
+            self._root.after_cancel(self._after_id)
+        self._after_id = self._root.after(self._delay if delay == None else delay, self._submit)
+
+    def _submit(self) -> None:
+        self._after_id = None
+        self._generation += 1
+        self._jobs.put((self._generation, self._get_entries())) # entries are read here, on the tk thread
+
+    def _work(self) -> None:
+        while True:
+            generation, entries = self._jobs.get()
+            while not self._jobs.empty(): # skip straight to the newest request
+                generation, entries = self._jobs.get_nowait()
+
+            is_stale = lambda: generation != self._generation
+
+            try:
+                result = self._render_function(entries, is_stale)
+            except Exception as exception:
+                result = f'Preview failed: {exception}'
+
+            if result != None and not is_stale():
+                self._results.put((generation, result))
+
+    # results are handed back to the tk thread here, tk can't be touched from the worker
+    def _poll(self) -> None:
+        while not self._results.empty():
+            generation, result = self._results.get_nowait()
+            if generation == self._generation:
+                self._show(result)
+
+        self._root.after(50, self._poll)
+
+    def _show(self, result: Img.Image | str) -> None:
+        import PIL.ImageTk as ImageTk # only needed once there is a preview
+
+        self._canvas.delete('all')
+
+        if isinstance(result, str):
+            self._photo = None
+            self._canvas.create_text(10, 10, anchor = tk.NW, text = result, fill = 'white', width = self._canvas.winfo_width() - 20)
+            self._canvas.config(scrollregion = (0, 0, 0, 0))
+            return
+
+        width = self._canvas.winfo_width()
+        if result.size[0] > width > 1: # fit wide previews to the pane
+            result = result.resize((width, round(result.size[1] * width / result.size[0])), resample = Img.LANCZOS)
+
+        self._photo = ImageTk.PhotoImage(result)
+        self._canvas.create_image(0, 0, anchor = tk.NW, image = self._photo)
+        self._canvas.config(scrollregion = (0, 0, *result.size))
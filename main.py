@@ -1,8 +1,9 @@
-import asyncio, tkinter.filedialog, tkinter.messagebox
+import argparse, glob, json, os, queue, sys, threading, time, tkinter.filedialog, tkinter.messagebox
 
 try:
     import bin.helpers.load as load
     import bin.helpers.render as render
+    import bin.helpers.search as search
     import bin.helpers.ui as ui
 
 except KeyError as key:
@@ -13,7 +14,33 @@ except Exception as exception:
     tkinter.messagebox.showerror('Module Load Error', f'Unexpected error while loading modules: {exception}\n\nAre your the load, render, and ui modules in bin/helpers?')
     exit()
 
-def generate(master_dict: dict[str: str | int], entries: list[dict[str: str | bool]]) -> None:
+# shows an error listing unknown item names (with suggestions) before anything is rendered, returns whether all names were fine
+def check_item_names(item_index: search.ItemIndex, entries: list[dict[str: str | bool]]) -> bool:
+    unknown = item_index.find_unknown(entries)
+    if unknown == {}:
+        return True
+
+    lines = []
+    for name, suggestion in unknown.items():
+        if name == '':
+            lines.append('(empty line)')
+        elif suggestion != None:
+            lines.append(f'{name} (did you mean {suggestion}?)')
+        else:
+            lines.append(name)
+
+    tkinter.messagebox.showerror('Unknown Items', 'These items don\'t exist (names are case-sensitive):\n\n' + '\n'.join(lines))
+    return False
+
+# renders on the Tk thread (errors are shown before the save dialog), then encodes on a worker thread so the window doesn't freeze for big infographics
+def generate(app: ui.App, master_dict: dict[str: str | int], item_index: search.ItemIndex, entries: list[dict[str: str | bool]]) -> None:
+    if master_dict == None:
+        tkinter.messagebox.showinfo('Loading', 'Items are still loading, try again in a moment.')
+        return
+
+    if not check_item_names(item_index, entries):
+        return
+
     try:
         infographic = render.generate_infographic(master_dict, entries)
 
@@ -21,31 +48,233 @@ def generate(master_dict: dict[str: str | int], entries: list[dict[str: str | bo
         tkinter.messagebox.showerror('Infographic Error', f'Unexpected error while making the infographic: {exception}\n\nMake sure you didn\'t leave any fields empty.')
         return
     
-    save_path = tkinter.filedialog.asksaveasfilename(confirmoverwrite = True, initialdir = './Infographics', initialfile = 'infographic.png', filetypes = [('PNG', '*.png')])
+    extension = render.OUTPUT_EXTENSIONS.get(render.OUTPUT_FORMAT, '')
+    save_path = tkinter.filedialog.asksaveasfilename(confirmoverwrite = True, initialdir = './Infographics', initialfile = 'infographic' + extension, filetypes = [(render.OUTPUT_FORMAT.upper(), '*' + extension)])
     if save_path == '':
         return
+
+    results = queue.Queue()
+
+    def run() -> None:
+        try:
+            render.save_infographic(infographic, save_path)
+            results.put(None)
+        except Exception as exception:
+            results.put(exception)
+
+    def poll() -> None:
+        if results.empty():
+            app.root.after(50, poll)
+            return
+
+        exception = results.get_nowait()
+        if exception != None:
+            tkinter.messagebox.showerror('Save Error', f'Unexpected error while saving the infographic: {exception}')
+
+    threading.Thread(target = run).start() # not a daemon, closing the window right after saving still finishes the file
+    poll()
+
+# for the live preview (runs on its worker thread); quest_images keeps the panel of every current quest so only edited quests are rendered again
+def render_preview(master_dict: dict[str: str | int], item_index: search.ItemIndex, quest_images: dict[str: render.Img.Image], entries: list[dict[str: str | bool]], is_stale) -> render.Img.Image | str | None:
+    if master_dict == None:
+        return 'Loading items...'
+
+    if entries == []:
+        return 'Add a quest to see a preview'
+
+    unknown = item_index.find_unknown(entries)
+    if unknown != {}:
+        return 'Unknown items:\n' + '\n'.join(name if name != '' else '(empty line)' for name in unknown)
+
+    template_image = render.load_template()
+    infographics = []
+
+    for entry in entries:
+        if is_stale(): # a newer edit came in, its render will replace this one
+            return None
+
+        quest_key = render.get_quest_key(entry)
+        if quest_key not in quest_images:
+            quest_images[quest_key] = render.render_quest(master_dict, entry, template_image)
+        infographics.append(quest_images[quest_key])
+
+    current_keys = {render.get_quest_key(entry) for entry in entries}
+    for quest_key in [quest_key for quest_key in quest_images if quest_key not in current_keys]: # forget removed or edited quests
+        del quest_images[quest_key]
+
+    if len(infographics) > 1:
+        return render.combine_images_vertically(infographics, 10)
     
-    infographic.save(save_path.removesuffix('.png') + '.png', 'PNG')
+    return infographics[0]
 
-def preview(master_dict: dict[str: str | int], entries: list[dict[str: str | bool]]) -> None:
-    try:
-        infographic = render.generate_infographic(master_dict, entries)
+# headless rendering; each spec file holds a list of entries in the same shape as app.get_quest_info() returns. returns the exit code
+# output_options are passed to render.save_infographic (output_format, compress_level, optimize, quantize)
+def render_batch(spec_patterns: list[str], output_folder: str, parallel: bool = render.PARALLEL_RENDER, **output_options) -> int:
+    spec_paths = []
+    for pattern in spec_patterns: # expanded here too since not every shell expands globs
+        spec_paths.extend(sorted(glob.glob(pattern)) or [pattern])
 
-    except Exception as exception:
-        tkinter.messagebox.showerror('Infographic Error', f'Unexpected error while making the infographic: {exception}\n\nMake sure you didn\'t leave any fields empty.')
+    master_dict = load.get_master_dict()
+    os.makedirs(output_folder, exist_ok = True)
+
+    failures = 0
+    total_start = time.perf_counter()
+
+    for spec_path in spec_paths:
+        start = time.perf_counter()
+
+        try:
+            with open(spec_path, 'r', encoding = 'utf-8') as f:
+                entries = json.load(f)
+            if isinstance(entries, dict): # a single quest is allowed too
+                entries = [entries]
+
+            plan = render.RenderPlan(master_dict, entries)
+            infographic = render.generate_infographic(master_dict, entries, parallel = parallel, plan = plan)
+
+            output_path = render.save_infographic(infographic, os.path.join(output_folder, os.path.splitext(os.path.basename(spec_path))[0]), **output_options)
+
+        except KeyError as key:
+            print(f'{spec_path}: FAILED, missing item or key {key}', file = sys.stderr)
+            failures += 1
+            continue
+
+        except Exception as exception:
+            print(f'{spec_path}: FAILED, {exception}', file = sys.stderr)
+            failures += 1
+            continue
+
+        print(f'{spec_path} -> {output_path} ({len(entries)} quests, {len(plan.cached_quests)} cached, {plan.unique_count}/{plan.total_count} sprites unique, {os.path.getsize(output_path) / 1024:.0f} KB, {time.perf_counter() - start:.2f}s)')
+
+    print(f'{len(spec_paths) - failures}/{len(spec_paths)} rendered in {time.perf_counter() - total_start:.2f}s')
+    render.prune_disk_caches()
+    load.close_master_dict(master_dict)
+
+    return 1 if failures else 0
+
+# reads master.json (and builds its item index) on a worker thread, then switches the app to it and the current sheets
+# the window stays usable meanwhile; only called at startup and once an update has fully finished. on_loaded runs after the switch
+def reload_master(app: ui.App, state: dict, live_preview: ui.LivePreview, on_loaded = None) -> None:
+    results = queue.Queue()
+
+    def run() -> None:
+        try:
+            master_dict = load.get_master_dict()
+            results.put((master_dict, search.ItemIndex(master_dict)))
+        except Exception as exception:
+            results.put(exception)
+            return
+
+        render.prune_disk_caches() # runs at startup and after every update, which is when disk cache files go stale
+
+    def poll() -> None:
+        if results.empty():
+            app.root.after(50, poll)
+            return
+
+        result = results.get_nowait()
+        if isinstance(result, Exception):
+            tkinter.messagebox.showerror('Load Error', f'Error while loading master.json: {result}')
+            return
+
+        # the previous master is dropped rather than closed, a preview render may still be using it; a MasterDatabase closes
+        # its connection once that render is done with it
+        state['Master'], state['Item Index'] = result
+        state['Quest Images'] = {}
+        render.clear_caches()
+
+        app.set_item_index(state['Item Index'])
+        live_preview.request(delay = 0)
+
+        if on_loaded != None:
+            on_loaded()
+
+    threading.Thread(target = run, daemon = True).start()
+    poll()
+
+def build_json_only(app: ui.App, state: dict, live_preview: ui.LivePreview) -> None:
+    load.parse_all()
+    reload_master(app, state, live_preview)
+
+# runs load.setup on its own event loop thread so the window keeps working, progress is passed back through app.root.after
+def start_update(app: ui.App, state: dict, live_preview: ui.LivePreview) -> None:
+    import asyncio
+
+    if state['Update'] != None: # already updating
         return
 
-    infographic.show()
+    loop = asyncio.new_event_loop()
+    messages = queue.Queue()
+    update = {'Loop': loop, 'Task': None}
+    state['Update'] = update
+
+    def run() -> None:
+        asyncio.set_event_loop(loop)
+        update['Task'] = loop.create_task(load.setup(lambda text, fraction: messages.put(('Progress', text, fraction))))
+
+        try:
+            loop.run_until_complete(update['Task'])
+            messages.put(('Finished',))
+        except asyncio.CancelledError:
+            messages.put(('Cancelled',))
+        except Exception as exception:
+            messages.put(('Failed', exception))
+        finally:
+            loop.close()
+
+    def poll() -> None:
+        while not messages.empty():
+            message = messages.get_nowait()
+
+            if message[0] == 'Progress':
+                app.show_update_progress(message[1], message[2])
+                continue
+
+            state['Update'] = None
+            app.hide_update_progress()
+
+            if message[0] == 'Finished':
+                reload_master(app, state, live_preview)
+            elif message[0] == 'Failed':
+                tkinter.messagebox.showerror('Update Error', f'Update failed: {message[1]}\n\nThe previous files are still being used.')
+            return
+
+        app.root.after(50, poll)
+
+    app.show_update_progress('Starting update', None)
+    threading.Thread(target = run, daemon = True).start()
+    poll()
+
+def cancel_update(state: dict) -> None:
+    update = state['Update']
+    if update != None and update['Task'] != None:
+        update['Loop'].call_soon_threadsafe(update['Task'].cancel)
 
 def main():
     REQUIRED_KEYS = {
                     'XML URLs',
                     'Sheet URL',
+                    'Download Concurrency',
+                    'Download Retries',
+                    'Master Backend',
                     'Upscale',
                     'Large Size',
                     'Small Size',
                     'Blueprint Size',
                     'Quantity Font Size',
+                    'Sheet Cache Size',
+                    'Sprite Cache Size',
+                    'Sprite Disk Cache',
+                    'Quest Disk Cache',
+                    'Disk Cache Size',
+                    'Parallel Render',
+                    'Sprite Atlas',
+                    'Keep Sheets',
+                    'Instrumentation',
+                    'Output Format',
+                    'PNG Compress Level',
+                    'PNG Optimize',
+                    'PNG Quantize',
                     'Auto Update',
                     'Frequency Options',
                     'Style'
@@ -78,6 +307,7 @@ def main():
     except FileNotFoundError as exception:
         if str(exception) == "['./bin/json/master.json']":
             if tkinter.messagebox.askokcancel('Master Missing', 'File master.json is missing, but can be generated by downloading xml and sheets. File master.json is essential to functioning. Proceed?'):
+                import asyncio
                 asyncio.run(load.setup())
                 updated = True
             else:
@@ -87,21 +317,56 @@ def main():
         tkinter.messagebox.showerror('Load Error', f'Error during loading: {exception}')
         return
 
-    if not updated and config['Auto Update'] == 1:
-        asyncio.run(load.setup())
-
-    master_dict = load.get_master_dict()
+    # everything that gets swapped after an update; Master and Item Index are None until reload_master below finishes
+    state = {'Master': None, 'Item Index': None, 'Quest Images': {}, 'Update': None}
 
     app = ui.App()
 
-    app.generate_button.config(command = lambda: generate(master_dict, app.get_quest_info()))
-    app.preview_button.config(command = lambda: preview(master_dict, app.get_quest_info()))
+    live_preview = ui.LivePreview(app.root, app.preview_canvas, app.get_quest_info, lambda entries, is_stale: render_preview(state['Master'], state['Item Index'], state['Quest Images'], entries, is_stale))
+    app.on_change = live_preview.request
+
+    app.generate_button.config(command = lambda: generate(app, state['Master'], state['Item Index'], app.get_quest_info()))
+    app.preview_button.config(command = lambda: live_preview.request(delay = 0))
+    app.cancel_update_button.config(command = lambda: cancel_update(state))
     
     app.settings_menubutton.menu.add_checkbutton(label = 'Auto Update', variable = app.options_auto_update, command = lambda: load.update_config('Auto Update', app.options_auto_update.get()))
-    app.settings_menubutton.menu.add_command(label = 'Update', command = lambda: asyncio.run(load.setup()))
-    app.settings_menubutton.menu.add_command(label = 'Build JSON Only', command = lambda: load.parse_all())
+    app.settings_menubutton.menu.add_command(label = 'Update', command = lambda: start_update(app, state, live_preview))
+    app.settings_menubutton.menu.add_command(label = 'Build JSON Only', command = lambda: build_json_only(app, state, live_preview))
+
+    # the window shows while the master loads; an auto update waits for it so its own reload can't be overwritten by this one
+    if not updated and config['Auto Update'] == 1:
+        reload_master(app, state, live_preview, on_loaded = lambda: start_update(app, state, live_preview))
+    else:
+        reload_master(app, state, live_preview)
 
     app.root.mainloop()
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description = 'Quest Infographic Maker, run without arguments for the app')
+        subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+        render_parser = subparsers.add_parser('render', help = 'render quest spec json files without opening the app')
+        render_parser.add_argument('specs', nargs = '+', help = 'spec files or glob patterns, e.g. specs/*.json')
+        render_parser.add_argument('-o', '--output', default = './Infographics', help = 'folder to write the pngs to')
+        render_parser.add_argument('-p', '--parallel', action = argparse.BooleanOptionalAction, default = bool(render.PARALLEL_RENDER), help = 'render the quests of each spec on all cores (Parallel Render in config by default)')
+        render_parser.add_argument('-f', '--format', choices = sorted(render.OUTPUT_EXTENSIONS), default = render.OUTPUT_FORMAT, help = 'output format, webp is lossless')
+        render_parser.add_argument('--compress-level', type = int, choices = range(10), default = render.PNG_COMPRESS_LEVEL, metavar = '0-9', help = 'png compression, 0 is fastest and biggest')
+        render_parser.add_argument('--optimize', action = argparse.BooleanOptionalAction, default = bool(render.PNG_OPTIMIZE), help = 'extra png compression pass (slow)')
+        render_parser.add_argument('--quantize', action = argparse.BooleanOptionalAction, default = bool(render.PNG_QUANTIZE), help = 'palette png when there are 256 colours or less (lossless)')
+
+        serve_parser = subparsers.add_parser('serve', help = 'keep rendering on a local http server (POST quest json to /render, GET /health)')
+        serve_parser.add_argument('--host', default = '127.0.0.1', help = 'address to listen on, localhost only by default')
+        serve_parser.add_argument('--port', type = int, default = 8765)
+        serve_parser.add_argument('-w', '--workers', type = int, default = os.cpu_count() or 1, help = 'renders running at once')
+
+        arguments = parser.parse_args()
+
+        if arguments.command == 'serve':
+            import bin.helpers.service as service
+            service.serve(arguments.host, arguments.port, arguments.workers)
+            sys.exit(0)
+
+        sys.exit(render_batch(arguments.specs, arguments.output, arguments.parallel, output_format = arguments.format, compress_level = arguments.compress_level, optimize = arguments.optimize, quantize = arguments.quantize))
+
     main()
\ No newline at end of file
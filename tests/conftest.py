@@ -0,0 +1,19 @@
+import os, shutil, sys
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT) # for the bin.helpers imports, whichever folder pytest runs from
+
+import bin.helpers.render as render
+
+# every path the app uses is relative to the working directory, so tests run in a copy of bin (assets, custom sheets
+# and config, with custom.json as the master) and never touch the checkout's cache or json
+@pytest.fixture
+def app_folder(tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(REPO_ROOT, 'bin'), tmp_path / 'bin', ignore = shutil.ignore_patterns('helpers', 'cache', 'atlas', 'profile', '__pycache__'))
+    shutil.copy(tmp_path / 'bin' / 'json' / 'custom.json', tmp_path / 'bin' / 'json' / 'master.json')
+    monkeypatch.chdir(tmp_path)
+
+    render.clear_caches()
+    yield tmp_path
+    render.clear_caches()
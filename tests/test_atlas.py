@@ -0,0 +1,45 @@
+import os, shutil, threading
+import bin.helpers.database as database
+import bin.helpers.render as render
+
+# a sheet that isn't custom (custom sheets are never packed), copied from the custom 16x16 one
+def make_master_dict() -> dict[str: str | int]:
+    shutil.copy('./bin/sheets/custom16x16.png', './bin/sheets/test16x16.png')
+    return {f'Test {index}': {'File': 'test16x16', 'Index': index, 'Size': 16, 'Quantity': 0, 'Contained': []} for index in range(5)}
+
+def check_atlas(master_dict) -> None:
+    render.build_sprite_atlas(master_dict, keep_sheets = 1)
+    render.close_atlas()
+
+    for name in master_dict:
+        item_dict = master_dict[name]
+        atlas_sprite = render._get_atlas_sprite(item_dict['File'], item_dict['Index'], item_dict['Size'])
+        assert atlas_sprite != None
+        assert atlas_sprite.tobytes() == render.get_sheet(item_dict['File']).crop((16 * item_dict['Index'], 0, 16 * item_dict['Index'] + 16, 16)).tobytes()
+
+def test_atlas_from_json_master(app_folder, monkeypatch):
+    monkeypatch.setattr(render, 'SPRITE_ATLAS', 1)
+    check_atlas(make_master_dict())
+
+# load.setup passes the MasterDatabase itself when Master Backend is sqlite
+def test_atlas_from_sqlite_master(app_folder, monkeypatch):
+    monkeypatch.setattr(render, 'SPRITE_ATLAS', 1)
+    database.build_master_database(make_master_dict())
+    master_database = database.MasterDatabase()
+
+    try:
+        assert dict(master_database.items()) == make_master_dict()
+        check_atlas(master_database)
+    finally:
+        master_database.close()
+        render.close_atlas()
+
+# a cancelled update leaves no half built atlas and deletes no sheets, even with keep_sheets off
+def test_cancelled_atlas_build_changes_nothing(app_folder, monkeypatch):
+    monkeypatch.setattr(render, 'SPRITE_ATLAS', 1)
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    render.build_sprite_atlas(make_master_dict(), keep_sheets = 0, cancel_event = cancel_event)
+    assert os.listdir('./bin/atlas') == []
+    assert os.path.exists('./bin/sheets/test16x16.png')
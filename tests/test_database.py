@@ -0,0 +1,35 @@
+import os
+import bin.helpers.database as database
+
+def item_dict(file: str, index: int) -> dict[str: str | int]:
+    return {'File': file, 'Index': index, 'Size': 8, 'Quantity': 0, 'Contained': []}
+
+# an open database is a snapshot: a rebuild (parse_all partway through an update) only shows up in databases opened after it
+def test_rebuild_keeps_open_database(app_folder):
+    old_master = {'A': item_dict('sheetA', 0), 'C': item_dict('sheetC', 1)}
+    new_master = {'A': item_dict('sheetA', 5), 'B': item_dict('sheetB', 2)}
+
+    database.build_master_database(old_master)
+    old_database = database.MasterDatabase()
+    assert old_database['A'] == old_master['A'] # cached before the rebuild
+
+    database.build_master_database(new_master)
+    new_database = database.MasterDatabase()
+
+    try:
+        assert old_database['A'] == old_master['A']
+        assert 'B' not in old_database
+        assert old_database['C'] == old_master['C']
+        assert len(old_database) == 2
+        assert old_database.sheets() == {'sheetA', 'sheetC'}
+        assert dict(old_database.items()) == old_master
+
+        assert dict(new_database.items()) == new_master
+        assert 'C' not in new_database
+        assert new_database.sheets() == {'sheetA', 'sheetB'}
+    finally:
+        old_database.close()
+        new_database.close()
+
+    database.build_master_database(new_master) # builds nobody has open anymore are removed
+    assert len([file for file in os.listdir('./bin/json') if file.endswith('.db')]) == 1
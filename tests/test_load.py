@@ -0,0 +1,242 @@
+import asyncio, hashlib, io, json, os, shutil, threading, time
+import aiohttp, aiohttp.web
+import PIL.Image as Img
+import pytest
+import bin.helpers.load as load
+
+# local stand-in for the asset server: serves files (path: bytes) with a strong ETag and answers conditional (304) and
+# range (206, 416) requests like the real one. failures[path] lists what the next requests to path get instead: 503,
+# 'Drop' (half the file, then the connection closes) or 'Stall' (half the file, then nothing until the server stops)
+# requests logs (path, status) of everything served, with 'Drop' and 'Stall' as their status
+class AssetServer:
+    def __init__(self, files: dict[str: bytes]):
+        self.files = files
+        self.failures = {}
+        self.requests = []
+        self._stopping = asyncio.Event()
+
+    @staticmethod
+    def get_etag(content: bytes) -> str:
+        return f'"{hashlib.sha1(content).hexdigest()[:16]}"'
+
+    async def __aenter__(self):
+        application = aiohttp.web.Application()
+        application.router.add_get('/{path:.*}', self._handle)
+        self._runner = aiohttp.web.AppRunner(application)
+        await self._runner.setup()
+        site = aiohttp.web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+        return self
+
+    async def __aexit__(self, *exception_info):
+        self._stopping.set()
+        await self._runner.cleanup()
+
+    async def _handle(self, request: aiohttp.web.Request) -> aiohttp.web.StreamResponse:
+        path = '/' + request.match_info['path']
+        content = self.files[path]
+        etag = self.get_etag(content)
+        failures = self.failures.get(path, [])
+        failure = failures.pop(0) if failures else None
+
+        if failure == 503:
+            self.requests.append((path, 503))
+            return aiohttp.web.Response(status = 503)
+
+        if failure in ('Drop', 'Stall'):
+            self.requests.append((path, failure))
+            response = aiohttp.web.StreamResponse(headers = {'ETag': etag, 'Content-Length': str(len(content))})
+            await response.prepare(request)
+            await response.write(content[:len(content) // 2])
+            if failure == 'Drop':
+                request.transport.close()
+            else:
+                await self._stopping.wait()
+            return response
+
+        if request.headers.get('If-None-Match') == etag:
+            self.requests.append((path, 304))
+            return aiohttp.web.Response(status = 304, headers = {'ETag': etag})
+
+        status, body = 200, content
+        if 'Range' in request.headers and request.headers.get('If-Range') == etag:
+            range_start = int(request.headers['Range'].removeprefix('bytes=').removesuffix('-'))
+            if range_start >= len(content):
+                self.requests.append((path, 416))
+                return aiohttp.web.Response(status = 416, headers = {'Content-Range': f'bytes */{len(content)}'})
+            status, body = 206, content[range_start:]
+
+        self.requests.append((path, status))
+        return aiohttp.web.Response(status = status, body = body, headers = {'ETag': etag})
+
+# runs function(server) with the server up, on its own event loop
+def with_server(files: dict[str: bytes], function):
+    async def run():
+        async with AssetServer(files) as server:
+            return await function(server)
+
+    return asyncio.run(run())
+
+ITEM_XML = b'<Objects><Object id="Server Item"><Texture><File>lofiObj</File><Index>3</Index></Texture></Object></Objects>'
+
+# a download cancelled half way (the Cancel Update button) leaves its .part file, which must not end up in bin/xml
+def test_cancelled_download_stays_out_of_xml_folder(app_folder):
+    async def cancel_download(server: AssetServer) -> None:
+        server.failures['/slow.xml'] = ['Stall'] # the rest of the file never arrives before the download is cancelled
+        async with aiohttp.ClientSession() as session:
+            download = load.download(session, f'{server.url}/slow.xml', './bin/xml/slow.xml', asyncio.Semaphore(1), {}, 0, [], load.UpdateProgress())
+            try:
+                await asyncio.wait_for(download, 0.5)
+            except asyncio.TimeoutError:
+                pass
+
+    with_server({'/slow.xml': b'<Objects><Object id="Slow Item"></Object></Objects>'}, cancel_download)
+
+    assert os.listdir('./bin/xml') == ['custom.xml']
+    assert os.path.getsize(f'{load.DOWNLOAD_FOLDER}/slow.xml.part') > 0
+
+    load.parse_all() # raised ParseError when the .part was in bin/xml
+    with open('./bin/json/master.json', 'r') as f:
+        assert 'Slow Item' not in json.load(f)
+
+# the second update of unchanged files gets a 304 for the xml: nothing is staged, nothing parsed and no sheet is asked for
+def test_unchanged_update_is_skipped(app_folder, monkeypatch):
+    sheet = io.BytesIO()
+    Img.new('RGBA', (128, 128)).save(sheet, 'PNG')
+    files = {'/equip.xml': ITEM_XML, '/sheets/lofiObj.png': sheet.getvalue()}
+
+    async def update_twice(server: AssetServer) -> None:
+        monkeypatch.setitem(load.settings.config, 'XML URLs', [f'{server.url}/equip.xml'])
+        monkeypatch.setitem(load.settings.config, 'Sheet URL', f'{server.url}/sheets/')
+        monkeypatch.setitem(load.settings.config, 'Sprite Atlas', 0)
+
+        await load.setup()
+        assert server.requests == [('/equip.xml', 200), ('/sheets/lofiObj.png', 200)]
+        with open('./bin/json/master.json', 'r') as f:
+            assert 'Server Item' in json.load(f)
+        assert load.get_validators()[f'{server.url}/equip.xml']['ETag'] == AssetServer.get_etag(ITEM_XML)
+
+        server.requests.clear()
+        monkeypatch.setattr(load, 'parse_all', lambda cancel_event = None: pytest.fail('parsed unchanged xml'))
+        await load.setup()
+        assert server.requests == [('/equip.xml', 304)]
+
+    with_server(files, update_twice)
+
+    assert os.listdir(load.DOWNLOAD_FOLDER) == []
+    with open('./bin/xml/equip.xml', 'rb') as f:
+        assert f.read() == ITEM_XML
+
+# a connection dropped half way is retried with Range and If-Range, and the server's 206 is appended to the .part file
+def test_dropped_download_resumes(app_folder):
+    validators = {}
+
+    async def drop_then_resume(server: AssetServer) -> tuple[bool, list[tuple]]:
+        server.failures['/equip.xml'] = ['Drop']
+        async with aiohttp.ClientSession() as session:
+            staged = []
+            changed = await load.download(session, f'{server.url}/equip.xml', './bin/xml/equip.xml', asyncio.Semaphore(1), validators, 1, staged, load.UpdateProgress())
+        assert server.requests == [('/equip.xml', 'Drop'), ('/equip.xml', 206)]
+        return changed, staged
+
+    changed, staged = with_server({'/equip.xml': ITEM_XML}, drop_then_resume)
+    assert changed
+
+    load.commit_downloads(staged, validators)
+    with open('./bin/xml/equip.xml', 'rb') as f:
+        assert f.read() == ITEM_XML
+    assert list(validators.values()) == [{'ETag': AssetServer.get_etag(ITEM_XML)}]
+
+# a .part that was already complete (cancelled before it was committed) gets a 416 for its range, and is downloaded again
+def test_complete_part_restarts_after_416(app_folder):
+    os.makedirs(load.DOWNLOAD_FOLDER, exist_ok = True)
+    with open(f'{load.DOWNLOAD_FOLDER}/equip.xml.part', 'wb') as f:
+        f.write(ITEM_XML)
+
+    async def download_again(server: AssetServer) -> list[tuple]:
+        validators = {f'{server.url}/equip.xml': {'Part ETag': AssetServer.get_etag(ITEM_XML)}}
+        staged = []
+        async with aiohttp.ClientSession() as session:
+            assert await load.download(session, f'{server.url}/equip.xml', './bin/xml/equip.xml', asyncio.Semaphore(1), validators, 0, staged, load.UpdateProgress())
+        assert server.requests == [('/equip.xml', 416), ('/equip.xml', 200)]
+        load.commit_downloads(staged, validators)
+
+    with_server({'/equip.xml': ITEM_XML}, download_again)
+
+    with open('./bin/xml/equip.xml', 'rb') as f:
+        assert f.read() == ITEM_XML
+
+# server errors are retried (after a 1s back off) until the retries run out
+def test_server_error_is_retried(app_folder):
+    async def retry(server: AssetServer) -> None:
+        server.failures['/equip.xml'] = [503]
+        staged = []
+        async with aiohttp.ClientSession() as session:
+            assert await load.download(session, f'{server.url}/equip.xml', './bin/xml/equip.xml', asyncio.Semaphore(1), {}, 1, staged, load.UpdateProgress())
+
+            server.failures['/equip.xml'] = [503, 503]
+            with pytest.raises(aiohttp.ClientResponseError):
+                await load.download(session, f'{server.url}/equip.xml', './bin/xml/equip.xml', asyncio.Semaphore(1), {}, 1, [], load.UpdateProgress())
+
+        assert server.requests == [('/equip.xml', 503), ('/equip.xml', 200), ('/equip.xml', 503), ('/equip.xml', 503)]
+        with open(staged[0][0], 'rb') as f:
+            assert f.read() == ITEM_XML
+
+    with_server({'/equip.xml': ITEM_XML}, retry)
+
+# .part files left in bin/xml by older versions are skipped instead of parsed
+def test_parse_all_only_reads_xml(app_folder):
+    with open('./bin/xml/slow.xml.part', 'w') as f:
+        f.write('<Objects><Object id="Slow Item">')
+
+    load.parse_all()
+    with open('./bin/json/master.json', 'r') as f:
+        master_dict = json.load(f)
+    with open('./bin/json/custom.json', 'r') as f:
+        assert master_dict == json.load(f)
+
+# more than one changed file goes through the process pool, whose workers are spawned (this machine may have one core)
+def test_parse_all_in_worker_processes(app_folder, monkeypatch):
+    shutil.copy('./bin/xml/custom.xml', './bin/xml/custom copy.xml')
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+
+    parse_seconds = load.parse_all()
+    assert sorted(parse_seconds) == ['custom copy.xml', 'custom.xml']
+    with open('./bin/json/master.json', 'r') as f:
+        master_dict = json.load(f)
+    with open('./bin/json/custom.json', 'r') as f:
+        assert master_dict == json.load(f)
+
+# a cancelled update stops parse_all before it writes master.json or the manifest
+def test_cancelled_parse_writes_nothing(app_folder):
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    os.remove('./bin/json/master.json') # so parse_all would write one
+    assert load.parse_all(cancel_event = cancel_event) == {}
+    assert not os.path.exists('./bin/json/master.json')
+    assert not os.path.exists('./bin/json/manifest.json')
+
+# cancelling an update while a step runs on a thread only returns once that step has stopped
+def test_cancel_waits_for_thread_step():
+    steps = []
+
+    def step(cancel_event: threading.Event) -> None:
+        steps.append('Started')
+        cancel_event.wait(10)
+        time.sleep(0.1) # still finishing (removing a half written file) after it noticed
+        steps.append('Stopped')
+
+    async def cancel_step() -> None:
+        task = asyncio.ensure_future(load._to_cancellable_thread(step))
+        while steps == []:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            steps.append('Cancelled')
+
+    asyncio.run(cancel_step())
+    assert steps == ['Started', 'Stopped', 'Cancelled']
@@ -0,0 +1,17 @@
+import json, os
+import main
+
+def write_spec(name: str, entries: list[dict[str: str | bool]]) -> str:
+    os.makedirs('./specs', exist_ok = True)
+    with open(f'./specs/{name}.json', 'w', encoding = 'utf-8') as f:
+        json.dump(entries, f)
+    return f'./specs/{name}.json'
+
+# an empty spec fails (exit code 1) instead of writing a blank image, the others are still rendered
+def test_render_batch_fails_on_empty_spec(app_folder, capsys):
+    quest = {'Input': ['My Custom Item'], 'Output': ['My Huge Custom Item'], 'Title': 'Quest', 'Icon': 'Repeatable', 'Chooseable': 0}
+    spec_paths = [write_spec('empty', []), write_spec('quest', [quest])]
+
+    assert main.render_batch(spec_paths, './out', parallel = False) == 1
+    assert os.listdir('./out') == ['quest.png']
+    assert 'empty.json: FAILED' in capsys.readouterr().err
@@ -0,0 +1,149 @@
+import os, random, threading, time
+import pytest
+import PIL.Image as Img
+import bin.helpers.render as render
+
+# create_silhouette as it was before the alpha mask, one getdata/putpixel per pixel
+def old_create_silhouette(image: Img.Image) -> Img.Image:
+    x = image.size[0]
+    silhouette = image.copy()
+
+    for i, pixel in enumerate(image.getdata()):
+        position = (i % x, i // x) # column, row
+        if pixel[3] != 0: # put black pixels on pixels with non-zero alpha values
+            silhouette.putpixel(position, (0, 0, 0, 255))
+
+    return silhouette
+
+# random colours with a mix of fully transparent, partly transparent and opaque pixels; transparent pixels keep their colour,
+# which the silhouette has to leave alone too
+def make_sprite(size: int, seed: int) -> Img.Image:
+    generator = random.Random(seed)
+    sprite = Img.new('RGBA', (size, size))
+    sprite.putdata([(generator.randrange(256), generator.randrange(256), generator.randrange(256), generator.choice((0, 0, 1, 128, 254, 255, 255))) for _ in range(size * size)])
+    return sprite
+
+SPRITES = [(size, seed) for size in (8, 16, 32) for seed in range(3)]
+
+@pytest.mark.filterwarnings('ignore:.*getdata:DeprecationWarning') # the old loop, on purpose
+@pytest.mark.parametrize('size, seed', SPRITES)
+def test_silhouette_matches_putpixel_loop(size, seed):
+    sprite = make_sprite(size, seed)
+    assert render.create_silhouette(sprite).tobytes() == old_create_silhouette(sprite).tobytes()
+
+@pytest.mark.filterwarnings('ignore:.*getdata:DeprecationWarning')
+@pytest.mark.parametrize('size, seed', SPRITES)
+def test_rendered_sprite_matches_putpixel_loop(app_folder, monkeypatch, size, seed):
+    sprite = make_sprite(size, seed)
+
+    for quantity in (0, 12):
+        rendered = render.render_one_sprite(sprite, quantity)
+        with monkeypatch.context() as patch:
+            patch.setattr(render, 'create_silhouette', old_create_silhouette)
+            old_rendered = render.render_one_sprite(sprite, quantity)
+
+        assert rendered.size == old_rendered.size == ((size + 2) * render.UPSCALE, (size + 2) * render.UPSCALE)
+        assert rendered.tobytes() == old_rendered.tobytes()
+
+def test_no_entries_is_an_error(app_folder):
+    with pytest.raises(ValueError):
+        render.generate_infographic(make_master_dict(), [], parallel = False)
+
+# custom.json's items, one per sprite size, plus a blueprint holding all three
+def make_master_dict() -> dict[str: str | int]:
+    master_dict = {f'Item {size}': {'File': f'custom{size}x{size}', 'Index': 0, 'Size': size, 'Quantity': 0, 'Contained': []} for size in (8, 16, 32)}
+    master_dict['Blueprint'] = {'File': 'custom16x16', 'Index': 1, 'Size': 16, 'Quantity': 0, 'Contained': ['Item 8', 'Item 16', 'Item 32']}
+    return master_dict
+
+@pytest.mark.parametrize('size', (8, 16, 32))
+def test_contained_tile_is_blueprint_size(app_folder, size):
+    tile = render.get_contained_tile(make_master_dict(), f'Item {size}')
+    assert tile.size == (render.BLUEPRINT_SIZE, render.BLUEPRINT_SIZE)
+
+@pytest.mark.parametrize('name', ('Item 8', 'Item 16', 'Item 32', 'Blueprint'))
+@pytest.mark.parametrize('image_number', (1, 2, 4))
+def test_item_tile_is_group_size(app_folder, name, image_number):
+    size = render.get_group_size(image_number)
+    assert size == (render.LARGE_SIZE if image_number < 2 else render.SMALL_SIZE)
+    assert render.get_item_tile(make_master_dict(), name, size).size == (size, size)
+
+def write_cache_file(path: str, size: int, age: int) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, 'wb') as f:
+        f.write(bytes(size))
+    os.utime(path, (time.time() - age, time.time() - age))
+
+def test_prune_deletes_least_recently_used(app_folder):
+    for age in range(4):
+        write_cache_file(f'./bin/cache/sprites/{age}.png', 100, 1000 + age)
+        write_cache_file(f'./bin/cache/quests/{age}.png', 100, 2000 + age)
+    write_cache_file('./bin/cache/quests/killed.png.1.1.tmp', 100, 1000)
+    write_cache_file('./bin/cache/quests/saving.png.1.1.tmp', 100, 0)
+
+    assert render.prune_disk_caches(450) == 4
+    assert sorted(os.listdir('./bin/cache/sprites')) == ['0.png', '1.png', '2.png', '3.png']
+    assert sorted(os.listdir('./bin/cache/quests')) == ['saving.png.1.1.tmp']
+
+    render.prune_disk_caches(250) # oldest first
+    assert sorted(os.listdir('./bin/cache/sprites')) == ['0.png', '1.png']
+
+    render.touch_disk_cache('./bin/cache/sprites/1.png') # older than 0 until it's used again
+    render.prune_disk_caches(100)
+    assert os.listdir('./bin/cache/sprites') == ['1.png']
+
+# a quest panel that can't be read is rendered again and written back, not just rendered on every run
+def test_unreadable_quest_is_cached_again(app_folder, monkeypatch):
+    monkeypatch.setattr(render, 'QUEST_DISK_CACHE', 1)
+    master_dict = make_master_dict()
+    entries = [{'Input': ['Item 8'], 'Output': [name], 'Title': name, 'Icon': 'Repeatable', 'Chooseable': 0} for name in ('Item 32', 'Blueprint')]
+
+    expected = render.generate_infographic(master_dict, entries, parallel = False).tobytes()
+    cache_path = render.RenderPlan(master_dict, entries).quest_cache_paths[1]
+    with open(cache_path, 'wb') as f:
+        f.write(b'not a png')
+
+    assert render.generate_infographic(master_dict, entries, parallel = False).tobytes() == expected
+    assert render.load_cached_quest(cache_path) != None
+
+# parallel render started while another thread (the live preview) holds _cache_lock; forked workers inherited the lock as held
+# and hung in get_sheet forever
+def test_parallel_render_while_cache_lock_is_held(app_folder, monkeypatch):
+    monkeypatch.setattr(render, 'QUEST_DISK_CACHE', 0)
+    master_dict = make_master_dict()
+    entries = [{'Input': ['Item 8'], 'Output': [name], 'Title': name, 'Icon': 'Repeatable', 'Chooseable': 0} for name in ('Item 16', 'Item 32', 'Blueprint')]
+    expected = render.generate_infographic(master_dict, entries, parallel = False).tobytes()
+    render.clear_caches()
+
+    lock_taken = threading.Event()
+    def hold_cache_lock() -> None:
+        with render._cache_lock:
+            lock_taken.set()
+            time.sleep(1)
+
+    threading.Thread(target = hold_cache_lock, daemon = True).start()
+    lock_taken.wait()
+
+    results = []
+    render_thread = threading.Thread(target = lambda: results.append(render.generate_infographic(master_dict, entries, parallel = True).tobytes()), daemon = True)
+    render_thread.start()
+    render_thread.join(60)
+
+    assert results == [expected]
+
+# reload_master clears the caches once the master has loaded; that must not read config.json a second time
+def test_clear_caches_does_not_read_config(app_folder, monkeypatch):
+    monkeypatch.setattr(render.settings, 'read_config', lambda: pytest.fail('config.json read again'))
+    render.assets.quantity_font
+    render.clear_caches()
+    assert render.assets._quantity_font == None
+
+# with Quest Disk Cache off there's no quest cache to hit or miss, so /health doesn't report a 0% hit rate for it
+@pytest.mark.parametrize('quest_disk_cache', (0, 1))
+def test_quest_cache_counts_only_when_on(app_folder, monkeypatch, quest_disk_cache):
+    monkeypatch.setattr(render, 'QUEST_DISK_CACHE', quest_disk_cache)
+    monkeypatch.setattr(render, 'cache_stats', render.collections.Counter())
+    entries = [{'Input': ['Item 8'], 'Output': [name], 'Title': name, 'Icon': 'Repeatable', 'Chooseable': 0} for name in ('Item 16', 'Item 32')]
+
+    render.generate_infographic(make_master_dict(), entries, parallel = False)
+    assert render.cache_stats['Quest Cache Misses'] == 2 * quest_disk_cache
+    assert render.cache_stats['Quest Cache Hits'] == 0
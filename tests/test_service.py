@@ -0,0 +1,103 @@
+import concurrent.futures, http.client, io, json, socket, sqlite3, threading
+import PIL.Image as Img
+import pytest
+import bin.helpers.load as load
+import bin.helpers.render as render
+import bin.helpers.service as service
+
+QUEST = {'Input': ['My Custom Item', 'My Bigger Custom Item'], 'Output': ['My Huge Custom Item'], 'Title': 'Quest', 'Icon': 'Repeatable', 'Chooseable': 1}
+
+# sprites of every size from the custom sheets, so concurrent requests share lots of sprites that aren't cached yet
+def write_master() -> dict[str: str | int]:
+    master_dict = json.load(open('./bin/json/master.json'))
+    for size in (8, 16, 32):
+        for index in range(12):
+            master_dict[f'Sprite {size} {index}'] = {'File': f'custom{size}x{size}', 'Index': index, 'Size': size, 'Quantity': index, 'Contained': []}
+
+    with open('./bin/json/master.json', 'w') as f:
+        json.dump(master_dict, f)
+    return master_dict
+
+def post(port: int, path: str, body: bytes) -> tuple[int, bytes]:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout = 120)
+    try:
+        connection.request('POST', path, body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+# many requests at once on a cold disk cache, so several workers render and save the same sprites and quests at the
+# same time; reading a file another worker was still writing used to fail those requests with 500
+def test_concurrent_renders_on_cold_cache(app_folder):
+    master_dict = write_master()
+    names = sorted(master_dict)
+    entries = [[dict(QUEST, Input = names[number % 12:number % 12 + 8], Output = names[-4 - number % 8:][:4], Title = f'Quest {number % 8}')] for number in range(64)]
+
+    server = service.create_server('127.0.0.1', 0, workers = 4)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    port = server.server_address[1]
+
+    try:
+        bodies = [json.dumps(entry).encode() for entry in entries]
+        with concurrent.futures.ThreadPoolExecutor(max_workers = 64) as executor:
+            responses = list(executor.map(lambda body: post(port, '/render', body), bodies))
+
+        assert [status for status, _ in responses] == [200] * 64, [content[:200] for status, content in responses if status != 200]
+        assert service.RenderRequestHandler.service.get_stats()['Errors'] == 0
+
+        expected = render.generate_infographic(master_dict, entries[0], parallel = False)
+        with Img.open(io.BytesIO(responses[0][1])) as image:
+            assert image.convert('RGBA').tobytes() == expected.tobytes()
+
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.RenderRequestHandler.service.close()
+
+def test_unknown_item_is_bad_request(app_folder):
+    server = service.create_server('127.0.0.1', 0, workers = 1)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    try:
+        status, _ = post(server.server_address[1], '/render', json.dumps([dict(QUEST, Input = ['Not An Item'])]).encode())
+        assert status == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.RenderRequestHandler.service.close()
+
+# Content-Length decides how much of the body is read, so a missing or malformed one is answered instead of raising or blocking
+def test_bad_content_length(app_folder):
+    server = service.create_server('127.0.0.1', 0, workers = 1)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    def post_raw(request: bytes) -> int:
+        with socket.create_connection(server.server_address, timeout = 30) as connection:
+            connection.sendall(request)
+            return int(connection.makefile('rb').readline().split()[1])
+
+    try:
+        assert post_raw(b'POST /render HTTP/1.1\r\nHost: localhost\r\n\r\n') == 411
+        for content_length in (b'abc', b'-1', b'1.5'):
+            assert post_raw(b'POST /render HTTP/1.1\r\nHost: localhost\r\nContent-Length: ' + content_length + b'\r\n\r\n[]') == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.RenderRequestHandler.service.close()
+
+# a worker that reloads after an update closes the master.db connection it had, instead of leaving one open per reload
+def test_worker_reload_closes_old_database(app_folder, monkeypatch):
+    monkeypatch.setitem(load.settings.config, 'Master Backend', 'sqlite')
+    service._init_worker()
+    old_master = service._worker_master_dict
+
+    try:
+        service._reload_worker_if_changed(service._worker_generation + 1)
+        assert service._worker_master_dict is not old_master
+        assert 'My Custom Item' in service._worker_master_dict
+
+        with pytest.raises(sqlite3.ProgrammingError): # closed
+            'My Custom Item' in old_master
+    finally:
+        load.close_master_dict(service._worker_master_dict)